@@ -1,453 +1,713 @@
-from flask import Flask, render_template_string, request, jsonify
+import time
+# Imports are the bulk of a cold start on a Pi Zero, so they go in the startup report too
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, abort, g, request, jsonify, send_from_directory, stream_with_context
 import motor_logic
+from assets import load_assets, not_modified, send_asset
+from camera import FeedSnapshots, SnapshotCache, camera_configured, select_provider
+from checkpoints import RESUME_POLICIES, CheckpointJournal
+from config_store import ConfigStore
+from feed_queue import PRIORITIES, QueueFull
+from feed_scheduler import CATCH_UP_POLICIES, MAX_CATCH_UP_WINDOW, FeedScheduler, make_slot
+from feeders import DEFAULT_FEEDER, FeederRegistry, make_feeder
+import metrics
+import motor_process
+import planner
+from progress import ProgressHub
+import atexit
 import datetime
 import os
-import schedule
-import time
 import threading
-import json
-app = Flask(__name__)
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+app = Flask(__name__, static_folder=None)
 
 # Files to store data
-LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "last_fed.txt")
-SCHEDULE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule_config.json")
+# NACHO_DATA_DIR moves config and journals elsewhere (e.g. for benchmarks)
+DATA_DIR = os.environ.get("NACHO_DATA_DIR") or os.path.dirname(os.path.abspath(__file__))
+SCHEDULE_FILE = os.path.join(DATA_DIR, "schedule_config.json")
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
 
 # Global variables
-current_config = {"time": "10:00", "enabled": True, "steps": 512}  # Default
-scheduler_thread = None
-motor_thread = None
-stop_event = threading.Event()
-motor_status = "idle"
-
-def load_history():
-    if not os.path.exists(LOG_FILE):
-        return []
-    with open(LOG_FILE, "r") as f:
-        lines = f.readlines()
-    return [line.strip() for line in lines[-5:]] # Return last 5
-
-def save_history(timestamp):
-    history = load_history()
-    history.append(timestamp)
-    with open(LOG_FILE, "w") as f:
-        f.write("\n".join(history[-5:])) # Keep only last 5
-        f.write("\n") # Ensure newline at end
-
-def load_schedule():
-    global current_config
-    if os.path.exists(SCHEDULE_FILE):
-        with open(SCHEDULE_FILE, "r") as f:
-            try:
-                data = json.load(f)
-                # Handle migration or direct load
-                if isinstance(data, str): # Old format
-                     current_config = {"time": data, "enabled": True, "steps": 512}
-                else:
-                    current_config = data
-                    # Ensure steps exists if loading from older json
-                    if "steps" not in current_config:
-                        current_config["steps"] = 512
-                    if "stutter_fwd" not in current_config:
-                        current_config["stutter_fwd"] = 100
-                    if "stutter_back" not in current_config:
-                        current_config["stutter_back"] = 20
-                    if "camera_name" not in current_config:
-                        current_config["camera_name"] = ""
-            except:
-                pass # Use default if error
-    return current_config
-
-def save_schedule_config():
-    global current_config
-    with open(SCHEDULE_FILE, "w") as f:
-        json.dump(current_config, f)
-    update_scheduler()
-
-def feed_job():
-    print(f"Executing scheduled feed at {datetime.datetime.now()}")
-    steps = current_config.get("steps", 512)
-    motor_logic.run_motor(steps=steps, direction='forward')
-    now = datetime.datetime.now().strftime("%I:%M %p (%b %d)")
-    save_history(now + " - 🔴 (Scheduled)")
-
-def update_scheduler():
-    schedule.clear()
-    if current_config['enabled']:
-        schedule.every().day.at(current_config['time']).do(feed_job)
-        print(f"Scheduler updated: Feeding daily at {current_config['time']}")
-    else:
-        print("Scheduler updated: Disabled")
-
-def run_scheduler():
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
-
-# Initialize scheduler
-load_schedule()
-update_scheduler()
-scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-scheduler_thread.start()
-
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Nacho Feeder</title>
-    <meta name="viewport" content="width=device-width, initial-scale=1, maximum-scale=1">
-    <style>
-        * { box-sizing: border-box; }
-        body { 
-            font-family: 'Segoe UI', sans-serif; 
-            margin: 0;
-            padding: 0;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            min-height: 100vh;
-            background: #263238; 
-        }
-        .card { 
-            background: white; 
-            padding: 25px; 
-            border-radius: 25px; 
-            box-shadow: 0 15px 35px rgba(0,0,0,0.3); 
-            width: 95%; 
-            width: 95%; 
-            max-width: 800px; /* Wider for desktop */
-            text-align: center;
-        }
-        .main-content {
-            display: flex;
-            gap: 20px;
-            text-align: left;
-        }
-        @media (max-width: 600px) {
-            .main-content {
-                flex-direction: column;
-            }
-        }
-        h1 { color: #37474f; margin-bottom: 20px; font-size: 2rem; text-align: center; }
-        .slider-container { 
-            background: #f1f8e9;
-            padding: 15px;
-            border-radius: 15px;
-            margin: 20px 0; 
-        }
-        input[type=range] { width: 100%; height: 15px; cursor: pointer; }
-        .val-display { font-size: 28px; font-weight: bold; color: #689f38; }
-        
-        button { 
-            padding: 20px; 
-            font-size: 18px; 
-            margin: 10px 0; 
-            width: 100%; 
-            cursor: pointer; 
-            border-radius: 15px; 
-            border: none; 
-            font-weight: bold;
-            transition: transform 0.1s;
-        }
-        button:active { transform: scale(0.96); }
-        
-        .forward { background: #8bc34a; color: white; }
-        .reverse { background: #ff7043; color: white; }
-        .action-btn { background: #29b6f6; color: white; padding: 10px; margin-top: 5px;}
-        
-        #status { margin-top: 20px; font-weight: bold; color: #78909c; min-height: 24px; }
-        .history-section { 
-            font-size: 0.9rem;
-            color: #546e7a; 
-            margin-top: 15px; 
-            border-top: 1px solid #eee; 
-            padding-top: 15px; 
-            text-align: left;
-        }
-        .history-list { list-style: none; padding: 0; margin: 10px 0; }
-        .history-list li { padding: 5px 0; border-bottom: 1px solid #eee; }
-        
-        .schedule-container {
-            background: #e3f2fd; /* Light Blue */
-            padding: 20px;
-            border-radius: 15px;
-            margin: 20px 0;
-            border: 2px solid #90caf9;
-            box-shadow: 0 4px 6px rgba(0,0,0,0.05);
-        }
-        input[type=time] {
-            padding: 10px;
-            border-radius: 10px;
-            border: 1px solid #ddd;
-            font-size: 16px;
-        }
-    </style>
-</head>
-<body>
-    <div class="card">
-        <h1>🦎 Nacho Feeder</h1>
-        
-        <div class="main-content">
-            <!-- Left Column: Controls -->
-            <div class="schedule-container" style="background: #fff3e0; border: 1px solid #ffe0b2; flex: 1; margin:0;">
-                <h3 style="margin-top:0; color: #ef6c00;">Feeding Controls</h3>
-                
-                <label>Total Amount (Steps)</label>
-                <div style="display: flex; align-items: center;">
-                    <input type="range" id="stepSlider" min="100" max="10000" value="{{ config.get('steps', 512) }}" oninput="updateLabel('stepVal', this.value)" style="flex-grow: 1;">
-                    <span class="val-display" id="stepVal" style="min-width: 60px; text-align: right; font-size: 1.2rem;">{{ config.get('steps', 512) }}</span>
-                </div>
-
-                <div style="margin: 15px 0; border-top: 1px dashed #ccc; padding-top: 10px;">
-                    <div id="stutterOptions">
-                        <label style="font-size: 0.9em;">Forward Cycle:</label>
-                        <div style="display: flex; align-items: center;">
-                            <input type="range" id="stutterFwd" min="0" max="1000" value="{{ config.get('stutter_fwd', 100) }}" oninput="updateLabel('fwdVal', this.value)" style="flex-grow: 1;">
-                            <span style="min-width: 40px; text-align: right; font-weight: bold;" id="fwdVal">{{ config.get('stutter_fwd', 100) }}</span>
-                        </div>
-                        
-                        <label style="font-size: 0.9em;">Reverse Cycle:</label>
-                        <div style="display: flex; align-items: center;">
-                            <input type="range" id="stutterBack" min="0" max="1000" value="{{ config.get('stutter_back', 20) }}" oninput="updateLabel('backVal', this.value)" style="flex-grow: 1;">
-                            <span style="min-width: 40px; text-align: right; font-weight: bold;" id="backVal">{{ config.get('stutter_back', 20) }}</span>
-                        </div>
-                    </div>
-                </div>
-
-                <div id="controls" style="display: flex; gap: 10px;">
-                    <button class="forward" id="btnDispense" onclick="move('forward')" style="flex: 1;">DISPENSE</button>
-                    <button class="reverse" id="btnStop" onclick="stop()" style="display: none; background: #e53935; flex: 1;">🛑 STOP FEEDING</button>
-                </div>
-                <p id="status">System Ready</p>
-            </div>
-            
-            <!-- Right Column: Schedule & Logic -->
-            <div style="flex: 1; display: flex; flex-direction: column; gap: 20px;">
-                <div class="schedule-container" id="scheduleCard" style="margin: 0;">
-                    <h3 style="margin-top:0; color: #0277bd;">📅 Daily Schedule</h3>
-                    
-                    <div style="text-align: center; margin-bottom: 15px;">
-                        <p id="nextRun" style="font-size: 1.1em; font-weight: bold; color: #546e7a; margin: 5px 0;">
-                            Loading...
-                        </p>
-                    </div>
-
-                    <div style="display: flex; align-items: center; justify-content: center; margin-bottom: 15px; gap: 10px;">
-                        <label class="switch">
-                            <input type="checkbox" id="scheduleEnabled" {% if config.enabled %}checked{% endif %} onchange="updateNextRunLabel()">
-                            Enable
-                        </label>
-                        <input type="time" id="scheduleTime" value="{{ config.time }}" onchange="updateNextRunLabel()">
-                    </div>
-                    
-                    <button class="action-btn" onclick="updateSchedule()">Save Schedule</button>
-                </div>
-
-                <div class="history-section" style="margin:0; border:none; background: #f5f5f5; padding: 10px; border-radius: 15px;">
-                     <details>
-                        <summary style="cursor: pointer; font-weight: bold; color: #546e7a;">📜 Recent Feedings Log</summary>
-                        <ul class="history-list">
-                            {% for item in history %}
-                            <li>{{ item }}</li>
-                            {% else %}
-                            <li>No recent feedings</li>
-                            {% endfor %}
-                        </ul>
-                    </details>
-                </div>
-            </div>
-        </div>
-
-    <script>
-        function updateLabel(id, val) { document.getElementById(id).innerText = val; }
-
-
-
-        function move(dir) {
-            const steps = document.getElementById('stepSlider').value;
-            const stutter = true;
-            const cycle_fwd = document.getElementById('stutterFwd').value;
-            const cycle_back = document.getElementById('stutterBack').value;
-            
-            const status = document.getElementById('status');
-            status.innerText = "Starting...";
-            
-            fetch('/move', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({
-                    direction: dir, 
-                    steps: parseInt(steps), 
-                    stutter: stutter,
-                    cycle_fwd: parseInt(cycle_fwd),
-                    cycle_back: parseInt(cycle_back)
-                })
-            })
-            .then(res => res.json())
-            .then(data => {
-                if(data.status === "started") {
-                    monitorStatus();
-                } else {
-                    status.innerText = data.message || "Error";
-                }
-            });
-        }
-        
-        function stop() {
-            fetch('/stop', {method: 'POST'});
-        }
+CONFIG_DEFAULTS = {
+    "enabled": True,
+    "steps": 512,
+    "stutter_fwd": 100,
+    "stutter_back": 20,
+    "camera_name": "",
+    "start_speed": motor_logic.DEFAULT_PROFILE.start,
+    "cruise_speed": motor_logic.DEFAULT_PROFILE.cruise,
+    "accel": motor_logic.DEFAULT_PROFILE.accel,
+    "slots": [make_slot({"time": "10:00", "steps": 512})],
+    "catch_up": "skip",
+    "catch_up_window": 6,
+    "progress_hz": 4.0,
+    "feeders": [],  # Extra feeders beyond "main", see feeders.make_feeder
+    "resume": "offer",  # What to do with feeds cut short by a crash or power loss
+    "feed_snapshots": True,  # Photo from the camera after each feed, linked in the history
+}
+
+def migrate_slots(data):
+    # Schema 0 -> 1: the single daily "time" becomes the first feed slot
+    if "time" in data:
+        data["slots"] = [make_slot({"time": data.pop("time"), "steps": data.get("steps", 512)})]
+
+current_config = ConfigStore(SCHEDULE_FILE, CONFIG_DEFAULTS, migrations=[migrate_slots])
+progress_hub = ProgressHub()
+checkpoints = CheckpointJournal(os.path.join(DATA_DIR, "feed_checkpoints.jsonl"))
+atexit.register(checkpoints.flush)
+snapshots = SnapshotCache(lambda: select_provider(current_config["camera_name"]))
+feed_snapshots = FeedSnapshots(os.path.join(DATA_DIR, "snapshots"), snapshots)
+# Part of every /state ETag, so versions counted before a restart never match
+BOOT_ID = uuid.uuid4().hex[:8]
+
+FEED_DURATION = metrics.Histogram(
+    "feeder_feed_duration_seconds", "Wall time of each feed", labels=("feeder", "kind", "status")
+)
+REQUEST_LATENCY = metrics.Histogram(
+    "feeder_http_request_seconds", "Time to build each response", labels=("route", "method")
+)
+
+HISTORY_LABELS = {
+    "scheduled": " - 🔴 (Scheduled)",
+    "manual": " - 🟢 (Manual)",
+    "reverse": " - 🟠 (Unjam)",
+}
+
+def describe(entry):
+    # Display string for one journal entry, e.g. "10:00 AM (Oct 17) - 🔴 (Scheduled)"
+    when = datetime.datetime.fromtimestamp(entry["ts"]).strftime("%I:%M %p (%b %d)")
+    text = when + HISTORY_LABELS.get(entry["source"], "")
+    if entry.get("interrupted"):
+        text += f" - interrupted at {entry['completed']}/{entry['requested']}"
+    elif entry.get("stopped"):
+        text += f" - stopped at {entry['completed']}/{entry['requested']}"
+    return text
+
+def load_history(feeder_id=DEFAULT_FEEDER, limit=5):
+    # Newest first, straight from the in-memory ring buffer
+    return list(registry.get(feeder_id).journal.recent)[::-1][:limit]
+
+def save_history(feeder, job, steps_done, started, stopped):
+    entry = {
+        "ts": time.time(),
+        "source": job.kind,
+        "job": job.id,
+        "requested": job.params["steps"],
+        "completed": steps_done,
+        "duration": round(time.monotonic() - started, 2),
+        "stopped": stopped,
+    }
+    if current_config["feed_snapshots"] and camera_configured(current_config["camera_name"]):
+        # Taken in the background so the next feed doesn't wait on the camera;
+        # the link just 404s if the capture fails
+        entry["snapshot"] = f"{feeder.id}-{job.id}.jpg"
+        threading.Thread(target=feed_snapshots.capture, args=(entry["snapshot"],), daemon=True).start()
+    feeder.journal.append(entry)
+    return entry
+
+def feeder_settings(feeder_id):
+    # Main feeder settings are the top-level config keys
+    if feeder_id == DEFAULT_FEEDER:
+        return current_config.data
+    for settings in current_config["feeders"]:
+        if settings["id"] == feeder_id:
+            return settings
+    return None
+
+def update_feeder_settings(feeder_id, **changes):
+    if feeder_id == DEFAULT_FEEDER:
+        current_config.update(**changes)
+        return
+    current_config.update(feeders=[
+        dict(settings, **changes) if settings["id"] == feeder_id else settings
+        for settings in current_config["feeders"]
+    ])
+
+def config_profile(settings=None):
+    settings = settings or current_config.data
+    return motor_logic.make_profile(
+        settings.get("start_speed"),
+        settings.get("cruise_speed"),
+        settings.get("accel")
+    )
 
-        function monitorStatus() {
-            const btnDispense = document.getElementById('btnDispense');
-            const btnStop = document.getElementById('btnStop');
-            const status = document.getElementById('status');
-            
-            btnDispense.style.display = 'none';
-            btnStop.style.display = 'block';
-            status.innerText = "Feeding in progress...";
-            status.style.color = "#ff9800";
-            
-            const interval = setInterval(() => {
-                fetch('/status')
-                .then(res => res.json())
-                .then(data => {
-                    if (data.status === 'idle') {
-                        clearInterval(interval);
-                        status.innerText = "Feeding Complete ✨";
-                        status.style.color = "#689f38";
-                        btnDispense.style.display = 'block';
-                        btnStop.style.display = 'none';
-                        setTimeout(() => location.reload(), 1500);
-                    }
-                });
-            }, 1000);
+def feed_job(slot, due, catch_up=False):
+    # Runs on the scheduler thread, so only hand the feed to the motor worker
+    feeder_id = slot.get("feeder", DEFAULT_FEEDER)
+    feeder = registry.get(feeder_id)
+    settings = feeder_settings(feeder_id)
+    if feeder is None or settings is None:
+        return
+    late = " (catching up)" if catch_up else ""
+    print(f"Queueing scheduled feed on {feeder_id} for {due:%H:%M} at {datetime.datetime.now()}{late}")
+    # Remembered so feeds missed during downtime can be caught up on restart
+    current_config.update(last_fired=due.isoformat())
+    params = {
+        "steps": slot.get("steps", settings.get("steps", 512)),
+        "direction": "forward",
+        "cycle_fwd": settings.get("stutter_fwd", 100),
+        "cycle_back": settings.get("stutter_back", 20),
+        "profile": config_profile(settings),
+    }
+    if slot.get("net"):
+        try:
+            best = planner.optimize(params["steps"], params["cycle_fwd"], params["cycle_back"], params["profile"])
+            params.update(steps=best["steps"], cycle_fwd=best["cycle_fwd"])
+        except ValueError as e:
+            print(f"Can't plan net feed on {feeder_id} ({e}), feeding {params['steps']} steps as set")
+    try:
+        feeder.queue.submit("scheduled", params)
+    except QueueFull:
+        print(f"Feed queue full on {feeder_id}, skipping scheduled feed")
+
+def feed_params(settings, data):
+    # Motion for a feed, request values over the feeder's saved ones.
+    # `net_steps` asks for that much food instead of that much motor travel;
+    # the planner picks the quickest cycle that never runs forward more than
+    # `max_forward` steps (default: the stutter_fwd in use) between reversals.
+    # Raises ValueError on out-of-range values.
+    cycle_fwd = int(data.get('cycle_fwd', settings.get('stutter_fwd', 100)))
+    params = {
+        "steps": int(data.get('steps', settings.get('steps', 512))),
+        "cycle_fwd": cycle_fwd,
+        "cycle_back": int(data.get('cycle_back', settings.get('stutter_back', 20))),
+        "profile": motor_logic.make_profile(
+            data.get('start_speed', settings.get('start_speed')),
+            data.get('cruise_speed', settings.get('cruise_speed')),
+            data.get('accel', settings.get('accel'))
+        ),
+    }
+    if data.get('net_steps') is not None:
+        max_forward = int(data.get('max_forward', cycle_fwd))
+        best = planner.optimize(int(data['net_steps']), max_forward, params["cycle_back"], params["profile"])
+        params.update(steps=best["steps"], cycle_fwd=best["cycle_fwd"])
+    motor_logic.check_motion(params["steps"], params["cycle_fwd"], params["cycle_back"])
+    return params
+
+def queue_wait(feeder, kind="manual"):
+    # Seconds before a `kind` feed submitted now would start: what's left of
+    # the running feed plus everything queued ahead of it
+    snapshot = feeder.queue.snapshot()
+    ahead = [job for job in snapshot["queued"] if PRIORITIES[job["kind"]] <= PRIORITIES[kind]]
+    wait = 0.0
+    for job in ([snapshot["running"]] if snapshot["running"] else []) + ahead:
+        params = job["params"]
+        duration = planner.estimate(
+            params["steps"], params.get("cycle_fwd", 100), params.get("cycle_back", 20),
+            motor_logic.Profile(**params["profile"])
+        )["duration"]
+        if job["started"]:
+            duration = max(0.0, duration - (time.time() - job["started"]))
+        wait += duration
+    return wait
+
+def run_feed(feeder, job):
+    stop_event = feeder.stop_event
+    stop_event.clear()
+    status = "failed"
+    steps_done = 0
+    params = job.params
+    plan = motor_logic.compile_plan(
+        params["steps"], params.get("cycle_fwd", 100), params.get("cycle_back", 20), params["profile"]
+    )
+    phases_per_step = len(motor_logic.SEQUENCE)
+
+    def report(phase, elapsed):
+        checkpoints.progress(job.id, phase // phases_per_step)
+        progress_hub.publish({
+            "type": "progress",
+            "feeder": feeder.id,
+            "job": job.id,
+            "steps_done": phase // phases_per_step,
+            "steps": plan.steps,
+            "phase": plan.direction_at(phase - 1),
+            "eta": round(max(plan.duration - elapsed, 0), 1),
+        })
+
+    progress_hub.publish({
+        "type": "start", "feeder": feeder.id, "job": job.id, "kind": job.kind,
+        "steps": plan.steps, "duration": round(plan.duration, 2),
+    })
+    started = time.monotonic()
+    try:
+        checkpoints.begin(feeder.id, job)
+        steps_done = motor_logic.run_motor(
+            stop_event=stop_event,
+            stepper=feeder.driver,
+            progress=report,
+            progress_interval=1.0 / progress_hub.rate,
+            **params
+        )
+        status = "stopped" if stop_event.is_set() else "done"
+        # Record it even if stopped partway
+        entry = save_history(feeder, job, steps_done, started, status == "stopped")
+        progress_hub.publish({
+            "type": "stopped" if status == "stopped" else "complete",
+            "feeder": feeder.id, "job": job.id, "steps_done": steps_done, "steps": plan.steps,
+            "history": describe(entry), "snapshot": entry.get("snapshot"),
+        })
+    except Exception as e:
+        print(f"Motor error on {feeder.id}: {e}")
+        progress_hub.publish({"type": "error", "feeder": feeder.id, "job": job.id, "message": str(e)})
+    finally:
+        # The queue comes first so nothing below can leave the job "running"
+        feeder.queue.finish(job, status, steps_done)
+        FEED_DURATION.labels(feeder.id, job.kind, status).observe(time.monotonic() - started)
+        checkpoints.finish(job.id, steps_done)
+
+registry = FeederRegistry(DATA_DIR, run_feed)
+
+# What sync_feeders and update_scheduler last applied. Motion settings also
+# live in "feeders", so saving them must not rebuild either on the request thread.
+synced_definitions = None
+scheduled_slots = None
+
+def sync_feeders(changed=None):
+    global synced_definitions
+    definitions = {DEFAULT_FEEDER: motor_logic.PINS}
+    definitions.update((settings["id"], settings["pins"]) for settings in current_config["feeders"])
+    if changed is not None and definitions == synced_definitions:
+        return
+    registry.sync(definitions)
+    synced_definitions = definitions
+
+def all_slots():
+    # Every enabled feeder's slots on one timer heap, tagged with the feeder
+    # they belong to. The main feeder's "enabled" only covers its own slots.
+    slots = []
+    if current_config["enabled"]:
+        slots += [dict(slot, feeder=DEFAULT_FEEDER) for slot in current_config["slots"]]
+    for settings in current_config["feeders"]:
+        if settings["enabled"]:
+            slots += [dict(slot, feeder=settings["id"]) for slot in settings["slots"]]
+    return slots
+
+def update_scheduler(changed=None):
+    global scheduled_slots
+    slots = all_slots()
+    if changed is not None and slots == scheduled_slots:
+        return
+    scheduler.configure(slots, True)
+    scheduled_slots = slots
+    times = ", ".join(f"{slot['time']} ({slot['feeder']})" for slot in slots if slot["enabled"])
+    print(f"Scheduler updated: Feeding at {times}" if times else "Scheduler updated: Disabled")
+
+def schedule_info():
+    next_run = scheduler.next_run()
+    return {
+        "enabled": current_config["enabled"],
+        "slots": current_config["slots"],
+        "catch_up": current_config["catch_up"],
+        "catch_up_window": current_config["catch_up_window"],
+        "next_run": next_run.isoformat() if next_run else None,
+    }
+
+scheduler = FeedScheduler(feed_job)
+
+def resume_offers():
+    # Feeds cut short by a crash or power loss, waiting for a resume/dismiss
+    return [
+        {
+            "job": record["job"],
+            "feeder": record["feeder"],
+            "kind": record["kind"],
+            "requested": record["params"]["steps"],
+            "steps_done": record["steps_done"],
+            "remaining": record["params"]["steps"] - record["steps_done"],
+            "ts": record["ts"],
         }
-
-        // Check status on page load in case of refresh during feeding
-        window.addEventListener('load', () => {
-             fetch('/status')
-                .then(res => res.json())
-                .then(data => {
-                    if (data.status === 'running') {
-                        monitorStatus();
-                    }
-                });
-        });
-
-        
-        function updateSchedule() {
-            const time = document.getElementById('scheduleTime').value;
-            const enabled = document.getElementById('scheduleEnabled').checked;
-            const status = document.getElementById('status');
-            status.innerText = "Updating schedule...";
-            
-            fetch('/set_schedule', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({time: time, enabled: enabled})
+        for record in checkpoints.interrupted.values()
+    ]
+
+def resume_feed(job_id):
+    # Queues the rest of an interrupted feed; returns the new job, or None if
+    # there is nothing left to resume. Raises QueueFull like any other submit.
+    record = checkpoints.interrupted.get(job_id)
+    feeder = registry.get(record["feeder"]) if record else None
+    if feeder is None:
+        return None
+    params = dict(record["params"])
+    params["steps"] -= record["steps_done"]
+    params["profile"] = motor_logic.make_profile(**params["profile"])
+    job = None
+    if params["steps"] > 0:
+        job, _ = feeder.queue.submit(record["kind"], params, key=f"resume-{job_id}")
+        print(f"Resuming feed {job_id} on {feeder.id}: {params['steps']} steps left")
+    checkpoints.discard(job_id)
+    return job
+
+def recover_interrupted():
+    # Log what each interrupted feed got through, then resume per the "resume"
+    # policy. Only feeds within the catch-up window are resumed automatically.
+    policy = current_config["resume"]
+    window = current_config["catch_up_window"] * 3600
+    for record in checkpoints.open():
+        feeder = registry.get(record["feeder"])
+        if feeder is not None and not record.get("logged"):
+            feeder.journal.append({
+                "ts": record["ts"],
+                "source": record["kind"],
+                "job": record["job"],
+                "requested": record["params"]["steps"],
+                "completed": record["steps_done"],
+                "duration": None,
+                "stopped": True,
+                "interrupted": True,
             })
-            .then(res => res.json())
-            .then(data => {
-                status.innerText = "Schedule Saved! 🕒";
-                setTimeout(() => { status.innerText = "System Ready"; }, 2000);
-            });
-        }
-        
-        function updateNextRunLabel() {
-            const enabled = document.getElementById('scheduleEnabled').checked;
-            const time = document.getElementById('scheduleTime').value;
-            const label = document.getElementById('nextRun');
-            
-            if (!enabled) {
-                label.innerText = "⛔ Schedule Disabled";
-                label.style.color = "#b0bec5"; // Gray
-                return;
-            }
-            
-            // formatting time to AM/PM for display
-            const [hours, minutes] = time.split(':');
-            const d = new Date();
-            d.setHours(hours);
-            d.setMinutes(minutes);
-            const timeString = d.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
-            
-            label.innerText = "⚡ Next Feed: Daily at " + timeString;
-            label.style.color = "#0277bd"; // Blue
-        }
-
-        // Initial setup
-        updateNextRunLabel();
-
-    </script>
-</body>
-</html>
-"""
+            checkpoints.mark_logged(record["job"])
+        if feeder is None or policy == "off":
+            checkpoints.discard(record["job"])
+        elif policy == "auto" and time.time() - record["ts"] <= window:
+            resume_feed(record["job"])
+
+def update_progress_rate(changed=None):
+    progress_hub.rate = float(current_config["progress_hz"])
+
+def update_camera(changed=None):
+    snapshots.set_source(lambda: select_provider(current_config["camera_name"]))
+
+# Only the parts that care about a change get rebuilt
+current_config.subscribe(("feeders",), sync_feeders)
+current_config.subscribe(("slots", "enabled", "feeders"), update_scheduler)
+current_config.subscribe(("progress_hz",), update_progress_rate)
+current_config.subscribe(("camera_name",), update_camera)
+
+@lru_cache(maxsize=1)
+def site_assets():
+    # Read and gzipped on the first page load, not at startup
+    return load_assets(STATIC_DIR)
+
+def warm_up():
+    # After startup, so the first feed doesn't pay for these
+    motor_logic.compile_plan(
+        current_config["steps"], current_config["stutter_fwd"], current_config["stutter_back"], config_profile()
+    )
+    site_assets()
+
+startup_lock = threading.Lock()
+started = False
+startup_report = {}  # Phase name -> milliseconds, see /startup
+
+@contextmanager
+def startup_phase(name):
+    began = time.perf_counter()
+    yield
+    startup_report[name] = round((time.perf_counter() - began) * 1000, 1)
+
+def create_app():
+    # Loads config and starts the feeders and scheduler, once. Importing this
+    # module does none of that, so it can be imported by tests, tools and WSGI
+    # servers ("app:create_app()") without touching the motor or the files.
+    global started
+    with startup_lock:
+        if started:
+            return app
+        startup_report["imports"] = IMPORT_MS
+        began = time.perf_counter()
+        with startup_phase("config"):
+            current_config.load()
+        with startup_phase("feeders"):
+            motor_process.install()
+            sync_feeders()
+        with startup_phase("recover"):
+            recover_interrupted()
+        with startup_phase("scheduler"):
+            update_progress_rate()
+            update_scheduler()
+            last_fired = current_config.get("last_fired")
+            if last_fired:
+                scheduler.catch_up(
+                    all_slots(),
+                    datetime.datetime.fromisoformat(last_fired),
+                    current_config["catch_up"],
+                    current_config["catch_up_window"]
+                )
+            scheduler.start()
+        startup_report["total"] = round((time.perf_counter() - began) * 1000, 1)
+        started = True
+        threading.Thread(target=warm_up, daemon=True).start()
+        print("Startup: " + ", ".join(f"{name} {ms}ms" for name, ms in startup_report.items()))
+    return app
+
+def get_feeder(feeder_id):
+    feeder = registry.get(feeder_id)
+    if feeder is None:
+        abort(404)
+    return feeder
+
+def feeder_status(feeder):
+    stop_latency = feeder.driver.last_stop_latency
+    return {
+        "status": "running" if feeder.queue.busy() else "idle",
+        "jitter": feeder.driver.last_jitter,
+        "stop_latency_ms": round(stop_latency * 1000, 2) if stop_latency is not None else None,
+    }
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    # Served as plain "app:app" the first request does the startup instead
+    if not started:
+        create_app()
+
+@app.after_request
+def record_latency(response):
+    # Streaming responses (/events) are only timed until the stream starts
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_LATENCY.labels(route, request.method).observe(time.perf_counter() - g.started)
+    return response
 
 @app.route('/')
 def index():
-    history = load_history()
-    # Reverse to show newest first
-    return render_template_string(HTML_TEMPLATE, history=reversed(history), config=current_config)
-
-def run_motor_thread(steps, direction, stutter, cycle_fwd, cycle_back):
-    global motor_status
-    motor_status = "running"
-    stop_event.clear()
-    
-    try:
-        motor_logic.run_motor(
-            steps=steps, 
-            direction=direction, 
-            stutter=stutter, 
-            cycle_fwd=cycle_fwd, 
-            cycle_back=cycle_back,
-            stop_event=stop_event
+    return send_asset(site_assets()["index.html"])
+
+@app.route('/static/<name>')
+def static_asset(name):
+    assets = site_assets()
+    if name not in assets:
+        abort(404)
+    return send_asset(assets[name])
+
+@app.route('/state')
+def get_state():
+    # Dynamic half of the page: changes only when the config, history or resume offers do
+    journal = registry.get(DEFAULT_FEEDER).journal
+    etag = f"{BOOT_ID}-{current_config.version}-{journal.version}-{checkpoints.version}"
+    if not_modified(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(
+            config=current_config.data,
+            history=[dict(text=describe(entry), snapshot=entry.get("snapshot")) for entry in load_history()],
+            resume=resume_offers()
         )
-        # Update timestamp only if not stopped? Or always?
-        # Let's record it even if stopped partial
-        now = datetime.datetime.now().strftime("%I:%M %p (%b %d)")
-        save_history(now + " - 🟢 (Manual)")
-    except Exception as e:
-        print(f"Motor error: {e}")
-    finally:
-        motor_status = "idle"
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 @app.route('/move', methods=['POST'])
-def move():
-    global motor_thread
-    
-    if motor_status == "running":
-        return jsonify(status="error", message="Motor already running")
-
+@app.route('/feeders/<feeder_id>/move', methods=['POST'])
+def move(feeder_id=DEFAULT_FEEDER):
+    feeder = get_feeder(feeder_id)
+    settings = feeder_settings(feeder_id)
     data = request.get_json()
-    steps = int(data.get('steps', 512))
     direction = data.get('direction', 'forward')
     stutter = data.get('stutter', False)
-    cycle_fwd = int(data.get('cycle_fwd', 100))
-    cycle_back = int(data.get('cycle_back', 20))
-    
-    # Persist config
-    if direction == 'forward':
-        current_config['steps'] = steps
-        current_config['stutter_fwd'] = cycle_fwd
-        current_config['stutter_back'] = cycle_back
-        save_schedule_config()
-    
-    motor_thread = threading.Thread(
-        target=run_motor_thread, 
-        args=(steps, direction, stutter, cycle_fwd, cycle_back)
+    try:
+        params = feed_params(settings, data)
+    except (TypeError, ValueError) as e:
+        return jsonify(status="error", message=f"Invalid feed: {e}"), 400
+    steps, cycle_fwd, cycle_back, profile = (
+        params["steps"], params["cycle_fwd"], params["cycle_back"], params["profile"]
     )
-    motor_thread.start()
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    
+    # Compiling up front lets us report the exact feed duration
+    plan = motor_logic.compile_plan(steps, cycle_fwd, cycle_back, profile)
+
+    params = {
+        "steps": steps,
+        "direction": direction,
+        "stutter": stutter,
+        "cycle_fwd": cycle_fwd,
+        "cycle_back": cycle_back,
+        "profile": profile,
+    }
+    kind = "reverse" if direction == "reverse" else "manual"
+    try:
+        job, created = feeder.queue.submit(kind, params, key)
+    except QueueFull as e:
+        return jsonify(status="error", message=str(e)), 429
+
+    # Persist config (written to disk in the background). A net feed keeps
+    # its jam limit as the stutter setting, not the cycle picked to fit it.
+    if created and direction == 'forward':
+        update_feeder_settings(
+            feeder_id,
+            steps=steps,
+            stutter_fwd=int(data.get('max_forward', cycle_fwd)) if data.get('net_steps') is not None else cycle_fwd,
+            stutter_back=cycle_back,
+            start_speed=profile.start,
+            cruise_speed=profile.cruise,
+            accel=profile.accel
+        )
         
-    return jsonify(status="started")
+    return jsonify(
+        status=job.status,
+        job=job.to_dict(),
+        coalesced=not created,
+        duration=round(plan.duration, 2)
+    )
+
+@app.route('/plan', methods=['GET', 'POST'])
+@app.route('/feeders/<feeder_id>/plan', methods=['GET', 'POST'])
+def get_plan(feeder_id=DEFAULT_FEEDER):
+    # Dry run: what a feed with these settings would do, without moving.
+    # Takes the same fields as /move, as JSON or query parameters.
+    feeder = get_feeder(feeder_id)
+    data = request.get_json(silent=True) or request.args.to_dict()
+    try:
+        params = feed_params(feeder_settings(feeder_id), data)
+    except (TypeError, ValueError) as e:
+        return jsonify(status="error", message=f"Invalid plan: {e}"), 400
+    plan = planner.estimate(params["steps"], params["cycle_fwd"], params["cycle_back"], params["profile"])
+    wait = queue_wait(feeder)
+    eta = datetime.datetime.now() + datetime.timedelta(seconds=wait + plan["duration"])
+    return jsonify(dict(plan, queue_wait=round(wait, 2), eta=eta.isoformat(timespec="seconds")))
 
 @app.route('/stop', methods=['POST'])
-def stop_motor():
-    stop_event.set()
-    return jsonify(status="stopping")
+@app.route('/feeders/<feeder_id>/stop', methods=['POST'])
+def stop_motor(feeder_id=DEFAULT_FEEDER):
+    # STOP means motor off: queued feeds are dropped too, so nothing starts
+    # again a moment later. {"keep_queue": true} only stops the current feed.
+    feeder = get_feeder(feeder_id)
+    data = request.get_json(silent=True) or {}
+    cancelled = [] if data.get('keep_queue') else feeder.queue.cancel_pending()
+    feeder.stop_event.set()
+    return jsonify(status="stopping", cancelled=[job.id for job in cancelled])
 
 @app.route('/status')
-def get_status():
-    return jsonify(status=motor_status)
+@app.route('/feeders/<feeder_id>/status')
+def get_status(feeder_id=DEFAULT_FEEDER):
+    return jsonify(feeder_status(get_feeder(feeder_id)))
+
+@app.route('/feeders')
+def list_feeders():
+    feeders = [dict(id=DEFAULT_FEEDER, name="Main", pins=motor_logic.PINS)]
+    feeders += [dict(id=s["id"], name=s["name"], pins=s["pins"]) for s in current_config["feeders"]]
+    for info in feeders:
+        feeder = registry.get(info["id"])
+        if feeder is not None:
+            info.update(feeder_status(feeder))
+    return jsonify(feeders=feeders)
+
+@app.route('/feeders', methods=['POST'])
+def save_feeder():
+    # Adds or replaces an extra feeder: {id, name, pins, steps, stutter_fwd, stutter_back, slots, ...}
+    try:
+        settings = make_feeder(request.get_json())
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify(status="error", message=f"Invalid feeder: {e}"), 400
+    others = [s for s in current_config["feeders"] if s["id"] != settings["id"]]
+    taken = set(motor_logic.PINS).union(*(s["pins"] for s in others))
+    if taken & set(settings["pins"]):
+        return jsonify(status="error", message="Pins already used by another feeder"), 400
+    current_config.update(feeders=others + [settings])
+    return jsonify(status="success", feeder=settings)
+
+@app.route('/feeders/<feeder_id>', methods=['DELETE'])
+def delete_feeder(feeder_id):
+    remaining = [s for s in current_config["feeders"] if s["id"] != feeder_id]
+    if len(remaining) == len(current_config["feeders"]):
+        return jsonify(status="error", message="No such feeder"), 404
+    current_config.update(feeders=remaining)
+    return jsonify(status="deleted")
+
+@app.route('/startup')
+def get_startup():
+    return jsonify(startup_report)
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/events')
+def events():
+    # Server-Sent Events stream of feed start/progress/complete/stop/error
+    return Response(
+        stream_with_context(progress_hub.stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/history')
+@app.route('/feeders/<feeder_id>/history')
+def get_history(feeder_id=DEFAULT_FEEDER):
+    # Paginated, newest first: pass the returned 'next_before' to get the next page.
+    # With 'start'/'end' (unix timestamps) returns that time range instead.
+    journal = get_feeder(feeder_id).journal
+    try:
+        limit = min(int(request.args.get('limit', 20)), 500)
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        start = float(request.args.get('start', 0))
+        end = float(request.args.get('end', time.time() + 1))
+        before = float(request.args['before']) if request.args.get('before') else None
+    except ValueError as e:
+        return jsonify(status="error", message=f"Invalid history query: {e}"), 400
+    if 'start' in request.args or 'end' in request.args:
+        entries = journal.between(start, end)[::-1][:limit]
+    else:
+        entries = journal.tail(limit, before)
+    for entry in entries:
+        entry["text"] = describe(entry)
+    return jsonify(
+        entries=entries,
+        next_before=entries[-1]["ts"] if entries and len(entries) == limit else None
+    )
+
+@app.route('/queue')
+@app.route('/feeders/<feeder_id>/queue')
+def get_queue(feeder_id=DEFAULT_FEEDER):
+    return jsonify(get_feeder(feeder_id).queue.snapshot())
+
+@app.route('/queue/<job_id>', methods=['DELETE'])
+@app.route('/feeders/<feeder_id>/queue/<job_id>', methods=['DELETE'])
+def cancel_job(job_id, feeder_id=DEFAULT_FEEDER):
+    job = get_feeder(feeder_id).queue.cancel(job_id)
+    if job is None:
+        return jsonify(status="error", message="No queued job with that id"), 404
+    return jsonify(status="cancelled", job=job.to_dict())
+
+@app.route('/snapshot.jpg')
+def get_snapshot():
+    # Live camera view, ?thumb=1 for the small one. Revalidate with If-None-Match.
+    snapshot = snapshots.get()
+    if snapshot is None:
+        if not camera_configured(current_config["camera_name"]):
+            return jsonify(status="error", message="No camera configured"), 404
+        return jsonify(status="error", message=snapshots.error or "Camera unavailable"), 503
+    thumb = bool(request.args.get('thumb'))
+    etag = snapshot.etag + ("-thumb" if thumb else "")
+    if not_modified(etag):
+        response = Response(status=304)
+    else:
+        response = Response(snapshot.thumb if thumb else snapshot.jpeg, mimetype="image/jpeg")
+    response.set_etag(etag)
+    response.last_modified = snapshot.taken
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/snapshots/<name>')
+def get_feed_snapshot(name):
+    return send_from_directory(feed_snapshots.directory, name, mimetype="image/jpeg", max_age=86400)
+
+@app.route('/resume')
+def get_resume():
+    return jsonify(offers=resume_offers())
+
+@app.route('/resume/<job_id>', methods=['POST'])
+def resume(job_id):
+    if job_id not in checkpoints.interrupted:
+        return jsonify(status="error", message="No interrupted feed with that id"), 404
+    try:
+        job = resume_feed(job_id)
+    except QueueFull as e:
+        return jsonify(status="error", message=str(e)), 429
+    return jsonify(status="queued" if job else "nothing_left", job=job.to_dict() if job else None)
+
+@app.route('/resume/<job_id>', methods=['DELETE'])
+def dismiss_resume(job_id):
+    if checkpoints.discard(job_id) is None:
+        return jsonify(status="error", message="No interrupted feed with that id"), 404
+    return jsonify(status="dismissed")
+
+@app.route('/schedule')
+def get_schedule():
+    return jsonify(schedule_info())
 
 @app.route('/set_schedule', methods=['POST'])
 def set_schedule():
@@ -456,14 +716,45 @@ def set_schedule():
     enabled = data.get('enabled', True)
     camera_name = data.get('camera_name')
     
+    try:
+        slots = current_config['slots']
+        if 'slots' in data:
+            # Full list of feed slots: {time, steps, days, enabled, net}
+            slots = [make_slot(slot) for slot in data['slots']]
+        if new_time:
+            # Legacy single-time form edits the first slot
+            first = dict(slots[0]) if slots else {"steps": current_config.get("steps", 512)}
+            first['time'] = new_time
+            slots = [make_slot(first)] + slots[1:]
+        if data.get('catch_up', current_config['catch_up']) not in CATCH_UP_POLICIES:
+            raise ValueError("catch_up must be one of " + ", ".join(CATCH_UP_POLICIES))
+        if data.get('resume', current_config['resume']) not in RESUME_POLICIES:
+            raise ValueError("resume must be one of " + ", ".join(RESUME_POLICIES))
+        catch_up_window = float(data.get('catch_up_window', current_config['catch_up_window']))
+        if not 0 <= catch_up_window <= MAX_CATCH_UP_WINDOW:
+            raise ValueError(f"catch_up_window must be between 0 and {MAX_CATCH_UP_WINDOW} hours")
+        if camera_name is not None and not isinstance(camera_name, str):
+            raise ValueError("camera_name must be a string")
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify(status="error", message=f"Invalid schedule: {e}"), 400
+
     # Update whatever keys are present
-    if new_time: current_config['time'] = new_time
-    if 'enabled' in data: current_config['enabled'] = enabled
+    changes = {'slots': slots}
+    if 'enabled' in data: changes['enabled'] = enabled
+    if 'catch_up' in data: changes['catch_up'] = data['catch_up']
+    if 'catch_up_window' in data: changes['catch_up_window'] = catch_up_window
+    if 'resume' in data: changes['resume'] = data['resume']
+    if camera_name is not None: changes['camera_name'] = camera_name.strip()
+    if 'feed_snapshots' in data: changes['feed_snapshots'] = bool(data['feed_snapshots'])
     
-    save_schedule_config()
-    return jsonify(status="success", config=current_config)
+    current_config.update(**changes)
+    return jsonify(status="success", config=current_config.data, schedule=schedule_info())
+
 
 
+IMPORT_MS = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
+    # Production server by default; NACHO_SERVER picks the mode (see server.py)
+    import server
+    server.serve(create_app(), host='0.0.0.0', port=5000)
@@ -0,0 +1,62 @@
+import gzip
+import hashlib
+import os
+
+from flask import Response, request
+
+# Static shell of the UI, loaded and compressed once at startup
+ASSET_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+}
+
+
+class Asset:
+    def __init__(self, body, content_type, cache_control):
+        self.body = body
+        self.gzipped = gzip.compress(body, 9)
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.content_type = content_type
+        self.cache_control = cache_control
+
+
+def load_assets(directory):
+    # CSS/JS are served under versioned URLs so browsers can cache them for
+    # good; index.html references them through {{name}} placeholders.
+    assets = {}
+    for name in sorted(os.listdir(directory)):
+        ext = os.path.splitext(name)[1]
+        if name == "index.html" or ext not in ASSET_TYPES:
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            assets[name] = Asset(f.read(), ASSET_TYPES[ext], "public, max-age=31536000, immutable")
+
+    with open(os.path.join(directory, "index.html"), "r", encoding="utf-8") as f:
+        page = f.read()
+    for name, asset in assets.items():
+        page = page.replace("{{" + name + "}}", f"/static/{name}?v={asset.etag}")
+    assets["index.html"] = Asset(page.encode("utf-8"), ASSET_TYPES[".html"], "no-cache")
+    return assets
+
+
+def not_modified(etag):
+    return etag in request.if_none_match
+
+
+def send_asset(asset):
+    # Each content-coding is its own representation, so it gets its own ETag
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        etag, body = asset.etag + "-gz", asset.gzipped
+    else:
+        etag, body = asset.etag, asset.body
+    if not_modified(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, content_type=asset.content_type)
+        if body is asset.gzipped:
+            response.headers["Content-Encoding"] = "gzip"
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = asset.cache_control
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
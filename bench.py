@@ -0,0 +1,237 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# Off-Pi benchmarks for the stepping loop and the web app, e.g.
+#   python bench.py --out baseline.json
+#   python bench.py --baseline baseline.json
+# Everything runs against the recording GPIO backend and a throwaway data
+# directory, so it is safe to run on a development machine or on the Pi.
+os.environ.setdefault("NACHO_GPIO_BACKEND", "recording")
+os.environ.setdefault("NACHO_DATA_DIR", tempfile.mkdtemp(prefix="nacho-bench-"))
+
+import motor_logic
+from gpio_backends import RecordingBackend
+
+# (name, cycle_fwd, cycle_back); cycle_fwd=None means one continuous run
+STUTTER_CASES = [
+    ("continuous", None, 0),  # One forward run, split at MAX_CYCLE
+    ("stutter_20_5", 20, 5),
+    ("stutter_5_2", 5, 2),
+]
+
+HTTP_MIX = [("/status", "GET", 6), ("/", "GET", 3), ("/move", "POST", 1)]
+
+# Relative change counted as a regression, plus a floor so sub-millisecond
+# noise on tiny numbers doesn't fail the comparison
+TOLERANCE = 0.25
+MS_FLOOR = 0.5
+
+
+def percentiles(values, scale=1000):
+    # min/p50/p99/max in milliseconds
+    if not values:
+        return None
+    values = sorted(values)
+    last = len(values) - 1
+    return {
+        "min_ms": round(values[0] * scale, 3),
+        "p50_ms": round(values[last // 2] * scale, 3),
+        "p99_ms": round(values[last * 99 // 100] * scale, 3),
+        "max_ms": round(values[last] * scale, 3),
+    }
+
+
+def bench_motor(steps, profile):
+    results = {}
+    for name, cycle_fwd, cycle_back in STUTTER_CASES:
+        cycle_fwd = cycle_fwd or min(steps, motor_logic.MAX_CYCLE)
+        gpio = RecordingBackend()
+        stepper = motor_logic.StepperDriver(motor_logic.PINS, gpio)
+        plan = motor_logic.compile_plan(steps, cycle_fwd, cycle_back, profile)
+        began = time.perf_counter()
+        done = motor_logic.run_motor(steps, cycle_fwd=cycle_fwd, cycle_back=cycle_back, profile=profile, stepper=stepper)
+        elapsed = time.perf_counter() - began
+        stepper.close()
+
+        # Measured from the write timestamps, independent of StepClock's own stats
+        phases = len(plan.codes)
+        times = gpio.times[:phases]
+        errors = [times[i + 1] - times[i] - plan.dwells[i] for i in range(len(times) - 1)]
+        results[name] = {
+            "steps": done,
+            "planned_s": round(plan.duration, 3),
+            "elapsed_s": round(elapsed, 3),
+            "steps_per_s": round(done / elapsed, 1),
+            "overhead_ms": round((elapsed - plan.duration) * 1000, 3),
+            "calls_per_step": round(len(gpio.times) / done, 3),
+            "pin_changes_per_step": round(gpio.pin_changes() / done, 3),
+            "jitter": percentiles(errors),
+            "resyncs": stepper.last_jitter["resyncs"] if stepper.last_jitter else 0,
+        }
+    return results
+
+
+def bench_stop(trials, profile):
+    latencies = []
+    for _ in range(trials):
+        stepper = motor_logic.StepperDriver(motor_logic.PINS, RecordingBackend())
+        stop_event = motor_logic.StopEvent()
+        worker = threading.Thread(
+            target=motor_logic.run_motor,
+            args=(motor_logic.MAX_STEPS,),  # Long enough that only the stop ends it
+            kwargs={"cycle_fwd": 50, "cycle_back": 10, "profile": profile, "stop_event": stop_event, "stepper": stepper},
+        )
+        worker.start()
+        # Random offsets land the stop in ramps, cruise and reversal pauses alike
+        time.sleep(random.uniform(0.05, 0.4))
+        stop_event.set()
+        worker.join()
+        stepper.close()
+        latencies.append(stepper.last_stop_latency)
+    return {"trials": trials, "latency": percentiles(latencies)}
+
+
+def bench_http(duration, concurrency):
+    # Keep the scheduler from firing a real slot in the middle of the run
+    config = os.path.join(os.environ["NACHO_DATA_DIR"], "schedule_config.json")
+    if not os.path.exists(config):
+        with open(config, "w") as f:
+            json.dump({"enabled": False}, f)
+    import app
+    flask_app = app.create_app()
+    timings = {path: [] for path, _, _ in HTTP_MIX}
+    rejected = {path: 0 for path, _, _ in HTTP_MIX}
+    errors = {path: 0 for path, _, _ in HTTP_MIX}
+    routes = [(path, method) for path, method, weight in HTTP_MIX for _ in range(weight)]
+    deadline = time.perf_counter() + duration
+
+    def client():
+        # One test client per thread; requests go through the full WSGI stack
+        http = flask_app.test_client()
+        pick = random.Random()
+        while time.perf_counter() < deadline:
+            path, method = pick.choice(routes)
+            began = time.perf_counter()
+            if method == "POST":
+                response = http.post(path, json={"steps": 4, "cycle_fwd": 4, "cycle_back": 0, "cruise_speed": 1000, "accel": 10000})
+            else:
+                response = http.get(path)
+            timings[path].append(time.perf_counter() - began)
+            if response.status_code == 429:
+                rejected[path] += 1
+            elif response.status_code >= 400:
+                errors[path] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Don't leave queued feeds running past the benchmark
+    for feeder in app.registry:
+        feeder.queue.cancel_pending()
+        feeder.stop_event.set()
+
+    results = {"concurrency": concurrency, "duration_s": duration}
+    for path, _, _ in HTTP_MIX:
+        results[path] = {
+            "requests": len(timings[path]),
+            "requests_per_s": round(len(timings[path]) / duration, 1),
+            "rejected": rejected[path],
+            "errors": errors[path],
+            "latency": percentiles(timings[path]),
+        }
+    return results
+
+
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline):
+    # Regressions: throughput that fell or latency/jitter/call counts that rose
+    regressions = []
+    old = flatten(baseline)
+    for name, value in flatten(current).items():
+        if name not in old or name.startswith("meta.") or name.endswith("min_ms"):
+            continue
+        was = old[name]
+        if name.endswith("_per_s"):
+            worse = value < was * (1 - TOLERANCE)
+        elif name.endswith("_ms"):
+            worse = value > was * (1 + TOLERANCE) + MS_FLOOR
+        elif name.endswith("_per_step"):
+            worse = value > was
+        else:
+            continue
+        if worse:
+            regressions.append({"metric": name, "baseline": was, "current": value})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stepping loop and the web app off-Pi")
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--cruise", type=float, default=1000, help="Phases/s; faster than a feed to keep runs short")
+    parser.add_argument("--accel", type=float, default=10000)
+    parser.add_argument("--stop-trials", type=int, default=10)
+    parser.add_argument("--http-seconds", type=float, default=3.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--out", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="Results JSON to compare against; exits 1 on regressions")
+    args = parser.parse_args()
+    if not 0 < args.steps <= motor_logic.MAX_STEPS:
+        parser.error(f"--steps must be between 1 and {motor_logic.MAX_STEPS}")
+
+    profile = motor_logic.make_profile(None, args.cruise, args.accel)
+    # The app's own log lines go to stderr so stdout stays valid JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        results = {
+            "meta": {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "node": platform.node(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "profile": profile._asdict(),
+            },
+            "motor": bench_motor(args.steps, profile),
+            "stop": bench_stop(args.stop_trials, profile),
+        }
+        if not args.skip_http:
+            results["http"] = bench_http(args.http_seconds, args.concurrency)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        results["regressions"] = regressions
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for regression in regressions:
+        print(f"REGRESSION {regression['metric']}: {regression['baseline']} -> {regression['current']}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
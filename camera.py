@@ -0,0 +1,221 @@
+import glob
+import hashlib
+import io
+import os
+import threading
+import time
+
+# Camera snapshots for the page. One background refresher fetches from the
+# camera at most once per interval while someone is looking, every viewer
+# is served from the cached copy, and concurrent fetches are collapsed into
+# one (single-flight), so N open pages cost one upstream call.
+
+CAMERA_DIR_ENV = "NACHO_CAMERA_DIR"  # Stand-in camera: serve the newest JPEG in this folder
+THUMB_SIZE = (320, 240)
+IDLE_AFTER = 60.0  # Stop refreshing once nobody has looked for this long
+RETRY_AFTER = 10.0  # First wait before trying a failed camera login again; doubles up to MAX_RETRY
+MAX_RETRY = 600.0
+
+
+class CameraError(Exception):
+    pass
+
+
+class DirectoryProvider:
+    # For testing and off-Pi development: the newest *.jpg in a folder
+    name = "directory"
+
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self):
+        paths = glob.glob(os.path.join(self.path, "*.jpg")) + glob.glob(os.path.join(self.path, "*.jpeg"))
+        if not paths:
+            raise CameraError(f"No JPEGs in {self.path}")
+        with open(max(paths, key=os.path.getmtime), "rb") as f:
+            return f.read()
+
+
+class WyzeProvider:
+    # Latest thumbnail of a Wyze camera, by its name in the Wyze app.
+    # Credentials come from .env (see DEPLOY.md); wyze-sdk, requests and
+    # python-dotenv are optional dependencies, only needed for this.
+    name = "wyze"
+
+    def __init__(self, camera_name):
+        from wyze_sdk import Client
+        import requests
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+        except ImportError:
+            pass
+        self.camera_name = camera_name
+        self.requests = requests
+        self.client = Client(
+            email=os.environ.get("WYZE_EMAIL"),
+            password=os.environ.get("WYZE_PASSWORD"),
+            key_id=os.environ.get("WYZE_KEY_ID"),
+            api_key=os.environ.get("WYZE_API_KEY"),
+        )
+
+    def fetch(self):
+        for camera in self.client.cameras.list():
+            if camera.nickname == self.camera_name:
+                url = getattr(camera.thumbnail, "url", camera.thumbnail)
+                response = self.requests.get(url, timeout=10)
+                response.raise_for_status()
+                return response.content
+        raise CameraError(f"No camera named '{self.camera_name}'")
+
+
+def camera_configured(camera_name):
+    return bool(os.environ.get(CAMERA_DIR_ENV) or camera_name)
+
+
+def select_provider(camera_name):
+    # NACHO_CAMERA_DIR wins (testing); otherwise the Wyze camera, if named
+    directory = os.environ.get(CAMERA_DIR_ENV)
+    if directory:
+        return DirectoryProvider(directory)
+    if not camera_name:
+        return None
+    try:
+        return WyzeProvider(camera_name)
+    except ImportError:
+        print("wyze-sdk not installed, camera snapshots disabled")
+    except Exception as e:
+        print(f"Camera login failed: {e}")
+    return None
+
+
+def make_thumbnail(jpeg):
+    # Needs Pillow; without it the full image doubles as the thumbnail
+    try:
+        from PIL import Image
+    except ImportError:
+        return jpeg
+    image = Image.open(io.BytesIO(jpeg))
+    image.thumbnail(THUMB_SIZE)
+    out = io.BytesIO()
+    image.convert("RGB").save(out, "JPEG", quality=75)
+    return out.getvalue()
+
+
+class Snapshot:
+    def __init__(self, jpeg):
+        self.jpeg = jpeg
+        self.thumb = make_thumbnail(jpeg)
+        self.etag = hashlib.sha1(jpeg).hexdigest()[:16]
+        self.taken = time.time()
+
+
+class SnapshotCache:
+    def __init__(self, make_provider=None, interval=10.0):
+        # The provider is only created on first use, so startup never waits
+        # on a camera login. A failed login or fetch is retried with a
+        # backoff; until then viewers get the cached error.
+        self.make_provider = make_provider
+        self.provider = None
+        self.retry_at = 0.0
+        self.retry_delay = RETRY_AFTER
+        self.interval = interval
+        self.cond = threading.Condition()
+        self.current = None
+        self.fetching = False
+        self.error = None
+        self.last_viewed = 0.0
+        self.thread = None
+
+    def set_source(self, make_provider):
+        with self.cond:
+            self.make_provider = make_provider
+            self.provider = None
+            self.retry_at = 0.0
+            self.retry_delay = RETRY_AFTER
+            self.current = None
+            self.error = None
+
+    def get(self):
+        # Latest snapshot for a viewer; only blocks when there is none yet
+        # and the camera isn't backing off
+        self.last_viewed = time.monotonic()
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        return self.current or self.refresh()
+
+    def refresh(self):
+        # Single-flight: callers arriving mid-fetch wait for that fetch
+        # instead of starting their own
+        with self.cond:
+            if self.fetching:
+                while self.fetching:
+                    self.cond.wait()
+                return self.current
+            if time.monotonic() < self.retry_at:
+                return self.current
+            provider, make_provider = self.provider, self.make_provider
+            self.fetching = True
+        # The login and the fetch both run outside the lock
+        snapshot = error = None
+        try:
+            if provider is None and make_provider is not None:
+                provider = make_provider()
+                if provider is None:
+                    error = "Camera unavailable, will retry"
+            if provider is not None:
+                snapshot = Snapshot(provider.fetch())
+        except Exception as e:
+            print(f"Camera snapshot failed: {e}")
+            error = str(e)
+        with self.cond:
+            self.fetching = False
+            if make_provider is self.make_provider:  # Camera not changed meanwhile
+                self.provider = provider
+                if snapshot is not None:
+                    self.current = snapshot
+                    self.error = None
+                    self.retry_delay = RETRY_AFTER
+                elif error is not None:
+                    self.error = error
+                    self.retry_at = time.monotonic() + self.retry_delay
+                    self.retry_delay = min(self.retry_delay * 2, MAX_RETRY)
+            self.cond.notify_all()
+            return self.current
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if self.provider is not None and time.monotonic() - self.last_viewed < IDLE_AFTER:
+                self.refresh()
+
+
+class FeedSnapshots:
+    # One photo right after each feed, kept on disk and linked from the history
+    def __init__(self, directory, cache, keep=100):
+        self.directory = directory
+        self.cache = cache
+        self.keep = keep
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def capture(self, name):
+        began = time.time()
+        snapshot = self.cache.refresh()
+        if snapshot is None or snapshot.taken < began:
+            return False  # Camera failed; don't pass off an older picture as this feed's
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self.path(name) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(snapshot.jpeg)
+        os.replace(tmp, self.path(name))
+        self._prune()
+        return True
+
+    def _prune(self):
+        paths = sorted(glob.glob(os.path.join(self.directory, "*.jpg")), key=os.path.getmtime)
+        for path in paths[:-self.keep]:
+            os.remove(path)
@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import time
+
+RESUME_POLICIES = ("offer", "auto", "off")
+
+
+class CheckpointJournal:
+    # Crash-safe record of feeds in progress. A feed's start and end are
+    # committed straight away; progress updates only touch memory and a
+    # background thread group-commits whatever changed once per interval,
+    # one write and one fsync for all of them. That keeps checkpointing off
+    # the step timing and spares the SD card. Whatever was still open when
+    # the process died shows up in `interrupted` on the next start.
+    def __init__(self, path, interval=1.0, compact_bytes=64 * 1024):
+        self.path = path
+        self.interval = interval
+        self.compact_bytes = compact_bytes
+        self.lock = threading.Lock()
+        self.active = {}  # job id -> record of a feed in progress
+        self.dirty = set()
+        self.interrupted = {}  # job id -> record left open by a previous run
+        self.version = 0  # Bumped whenever `interrupted` changes
+        self.file = None
+        self.thread = None
+
+    def open(self):
+        records = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line from a crash
+                    if entry.get("type") == "end":
+                        records.pop(entry["job"], None)
+                    elif entry.get("type") == "logged":
+                        if entry["job"] in records:
+                            records[entry["job"]]["logged"] = True
+                    elif entry["job"] in records:
+                        records[entry["job"]]["steps_done"] = entry["steps_done"]
+                    else:
+                        records[entry["job"]] = entry
+        self.interrupted = {job_id: dict(record, type="begin") for job_id, record in records.items()}
+        self.version += 1
+        with self.lock:
+            self._compact()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return list(self.interrupted.values())
+
+    def begin(self, feeder_id, job):
+        record = {
+            "type": "begin",
+            "job": job.id,
+            "feeder": feeder_id,
+            "kind": job.kind,
+            "params": dict(job.params, profile=job.params["profile"]._asdict()),
+            "steps_done": 0,
+            "ts": time.time(),
+        }
+        with self.lock:
+            self.active[job.id] = record
+            self._commit([record])
+
+    def progress(self, job_id, steps_done):
+        # Called from the step engine's thread: memory only, no lock, no I/O
+        record = self.active.get(job_id)
+        if record is not None and record["steps_done"] != steps_done:
+            record["steps_done"] = steps_done
+            self.dirty.add(job_id)
+
+    def finish(self, job_id, steps_done=None):
+        with self.lock:
+            self.active.pop(job_id, None)
+            self.dirty.discard(job_id)
+            self._commit([{"type": "end", "job": job_id, "steps_done": steps_done}])
+            try:
+                if not self.active and self.file.tell() > self.compact_bytes:
+                    self._compact()
+            except (OSError, ValueError) as e:
+                print(f"Checkpoint compaction failed: {e}")
+
+    def mark_logged(self, job_id):
+        # Remembers that an interrupted feed is already in the feeding log, so
+        # a feed left on offer isn't logged again on every restart
+        with self.lock:
+            record = self.interrupted.get(job_id)
+            if record is not None and not record.get("logged"):
+                record["logged"] = True
+                self._commit([{"type": "logged", "job": job_id}])
+
+    def discard(self, job_id):
+        # Drops an interrupted feed, whether it was resumed or declined
+        with self.lock:
+            record = self.interrupted.pop(job_id, None)
+            if record is not None:
+                self._commit([{"type": "end", "job": job_id, "steps_done": record["steps_done"]}])
+                self.version += 1
+        return record
+
+    def flush(self):
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+            records = [self.active[job_id] for job_id in dirty if job_id in self.active]
+            if records:
+                self._commit([{"type": "progress", "job": r["job"], "steps_done": r["steps_done"]} for r in records])
+
+    def _commit(self, entries):
+        # Called with the lock held. A full or read-only SD card must not take
+        # the feed down with it, so write errors are only logged.
+        try:
+            self.file.write("".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except (OSError, ValueError) as e:
+            print(f"Checkpoint write failed: {e}")
+
+    def _compact(self):
+        # Called with the lock held: rewrites the file with only the feeds
+        # that are still open
+        if self.file is not None:
+            self.file.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for record in list(self.interrupted.values()) + list(self.active.values()):
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.file = open(self.path, "a")
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if self.dirty:
+                self.flush()
+
@@ -0,0 +1,59 @@
+import datetime
+import time
+
+# Time source for the scheduler and the step engine. Both only ever read
+# the time and wait through one of these, so a VirtualClock can stand in
+# for the real one and fast-forward days of feeding in seconds.
+
+
+class SystemClock:
+    virtual = False
+
+    def now(self):
+        return datetime.datetime.now()
+
+    def perf_counter(self):
+        return time.perf_counter()
+
+    def wait(self, cond, timeout=None):
+        # Called with cond held, like Condition.wait
+        return cond.wait(timeout)
+
+    def sleep_until(self, deadline):
+        # Busy-waits up to a perf_counter() deadline; only used for the
+        # last fraction of a millisecond before a phase is due
+        while time.perf_counter() < deadline:
+            pass
+
+
+class VirtualClock:
+    # Time only moves when someone waits, and then jumps straight to the end
+    # of the wait. Meant for one thread driving everything in order (see
+    # simulate.py); nothing ever actually blocks.
+    virtual = True
+
+    def __init__(self, start=None):
+        self.start = start or datetime.datetime.now()
+        self.elapsed = 0.0
+
+    def now(self):
+        return self.start + datetime.timedelta(seconds=self.elapsed)
+
+    def perf_counter(self):
+        return self.elapsed
+
+    def wait(self, cond, timeout=None):
+        if timeout is None:
+            raise RuntimeError("Waiting forever on a virtual clock")
+        self.elapsed += max(timeout, 0)
+        return False
+
+    def sleep_until(self, deadline):
+        self.elapsed = max(self.elapsed, deadline)
+
+    def advance_to(self, when):
+        # Jump to a wall-clock datetime (never backwards)
+        self.elapsed = max(self.elapsed, (when - self.start).total_seconds())
+
+
+SYSTEM_CLOCK = SystemClock()
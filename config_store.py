@@ -0,0 +1,99 @@
+import atexit
+import copy
+import json
+import os
+import threading
+
+
+class ConfigStore:
+    # Keeps the config in memory with a version counter. Changes reach disk
+    # later in one debounced write (temp file + rename, so a crash mid-write
+    # can't leave a torn file), and subscribers only hear about the keys
+    # they watch.
+    def __init__(self, path, defaults, migrations=(), delay=2.0):
+        self.path = path
+        self.defaults = defaults
+        self.migrations = list(migrations)  # migrations[n] upgrades schema n -> n + 1
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.data = copy.deepcopy(defaults)
+        self.version = 0
+        self.dirty = False
+        self.timer = None
+        self.subscribers = []
+        atexit.register(self.flush)
+
+    @property
+    def schema(self):
+        return len(self.migrations)
+
+    def load(self):
+        data = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                # Keep the bad file around for inspection instead of overwriting it
+                print(f"Config file unreadable ({e}), using defaults")
+                os.replace(self.path, self.path + ".corrupt")
+        if data is None:
+            data = {}
+        elif not isinstance(data, dict):
+            data = {"time": data}  # Oldest format was just the feeding time
+        for migrate in self.migrations[data.get("schema", 0):]:
+            migrate(data)
+        data["schema"] = self.schema
+        for key, value in self.defaults.items():
+            data.setdefault(key, copy.deepcopy(value))
+        with self.lock:
+            self.data = data
+            self.version += 1
+        return data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def subscribe(self, keys, callback):
+        # callback(changed_keys) runs after an update touching any of `keys`
+        self.subscribers.append((frozenset(keys), callback))
+
+    def update(self, **changes):
+        with self.lock:
+            changed = {key for key, value in changes.items() if self.data.get(key) != value}
+            if not changed:
+                return changed
+            data = dict(self.data)
+            data.update((key, changes[key]) for key in changed)
+            self.data = data  # Swapped whole, so readers never see a half-applied update
+            self.version += 1
+            self.dirty = True
+            if self.timer is None:
+                self.timer = threading.Timer(self.delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        for keys, callback in self.subscribers:
+            if keys & changed:
+                callback(changed)
+        return changed
+
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty:
+                return
+            data = self.data
+            self.dirty = False
+        tmp = self.path + ".tmp"
+        with self.write_lock:
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
@@ -0,0 +1,127 @@
+import json
+import os
+import struct
+import threading
+from collections import deque
+
+# Fixed-size index record per entry: timestamp and byte offset into the journal
+INDEX_RECORD = struct.Struct("<dQ")
+
+
+class FeedJournal:
+    # Append-only JSON-lines log of feeds with a small binary offset index
+    # next to it, so the newest entries or a time range can be read with a
+    # couple of seeks instead of scanning the file. Rotates by size and
+    # keeps the most recent entries in memory for the index page.
+    def __init__(self, path, max_bytes=256 * 1024, keep=4, ring_size=50):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.keep = keep  # Rotated segments kept besides the live one
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=ring_size)
+        self.version = 0  # Bumped on every append, for cache validation
+        for path in self.segments():
+            if not os.path.exists(index_path(path)):
+                _rebuild_index(path)
+        self.recent.extend(reversed(self.tail(ring_size)))
+
+    def segments(self):
+        # Journal files, newest first
+        paths = [self.path] + [f"{self.path}.{n}" for n in range(1, self.keep + 1)]
+        return [path for path in paths if os.path.exists(path)]
+
+    def append(self, entry):
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+        with self.lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "ab") as f:
+                offset = f.tell()
+                f.write(line)
+            with open(index_path(self.path), "ab") as f:
+                f.write(INDEX_RECORD.pack(entry["ts"], offset))
+            self.recent.append(entry)
+            self.version += 1
+
+    def _rotate(self):
+        for n in range(self.keep, 0, -1):
+            older = f"{self.path}.{n}"
+            newer = f"{self.path}.{n - 1}" if n > 1 else self.path
+            for src, dst in ((newer, older), (index_path(newer), index_path(older))):
+                if os.path.exists(src):
+                    os.replace(src, dst)
+
+    def tail(self, limit, before=None):
+        # Up to `limit` newest entries (newest first), optionally older than `before`
+        out = []
+        for path in self.segments():
+            if len(out) >= limit:
+                break
+            with open(index_path(path), "rb") as index:
+                end = _bisect(index, before) if before is not None else _count(index)
+                start = max(0, end - (limit - len(out)))
+                out.extend(reversed(_read_entries(path, index, start, end)))
+        return out
+
+    def between(self, start, end):
+        # Entries with start <= ts < end, oldest first
+        out = []
+        for path in reversed(self.segments()):
+            with open(index_path(path), "rb") as index:
+                first = _bisect(index, start)
+                last = _bisect(index, end)
+                out.extend(_read_entries(path, index, first, last))
+        return out
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+def _rebuild_index(path):
+    # The index is derived data, so a lost one is rebuilt from the journal
+    # rather than taking the app down. Torn lines are left out of it.
+    print(f"Rebuilding missing journal index for {path}")
+    tmp = index_path(path) + ".tmp"
+    with open(path, "rb") as f, open(tmp, "wb") as index:
+        offset = 0
+        for line in f:
+            try:
+                index.write(INDEX_RECORD.pack(json.loads(line)["ts"], offset))
+            except (ValueError, KeyError, TypeError):
+                pass
+            offset += len(line)
+    os.replace(tmp, index_path(path))
+
+
+def _count(index):
+    index.seek(0, os.SEEK_END)
+    return index.tell() // INDEX_RECORD.size
+
+
+def _record(index, n):
+    index.seek(n * INDEX_RECORD.size)
+    return INDEX_RECORD.unpack(index.read(INDEX_RECORD.size))
+
+
+def _bisect(index, ts):
+    # Number of entries with a timestamp before ts
+    lo, hi = 0, _count(index)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _record(index, mid)[0] < ts:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _read_entries(path, index, start, end):
+    if start >= end:
+        return []
+    first = _record(index, start)[1]
+    last = _record(index, end)[1] if end < _count(index) else None
+    with open(path, "rb") as f:
+        f.seek(first)
+        data = f.read() if last is None else f.read(last - first)
+    return [json.loads(line) for line in data.splitlines() if line]
@@ -0,0 +1,160 @@
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+# Lower value runs first: unjamming beats a manual feed beats the schedule
+PRIORITIES = {"reverse": 0, "manual": 1, "scheduled": 2}
+
+# A duplicate of the job that just started (e.g. a double-tapped DISPENSE)
+# is folded into it rather than queued again
+COALESCE_WINDOW = 2.0
+
+
+class QueueFull(Exception):
+    pass
+
+
+class FeedJob:
+    def __init__(self, kind, params, key=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.kind = kind
+        self.params = params
+        self.key = key
+        self.status = "queued"  # queued -> running -> done / stopped / failed, or cancelled
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+
+    def to_dict(self):
+        params = dict(self.params)
+        if "profile" in params:
+            params["profile"] = params["profile"]._asdict()
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": params,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "result": self.result,
+        }
+
+
+class FeedQueue:
+    # Priority queue of feed jobs consumed by the single motor worker.
+    # Admission, coalescing and cancellation all happen under one lock.
+    def __init__(self, max_pending=10, keep_keys=100, keep_done=20):
+        self.cond = threading.Condition()
+        self.heap = []
+        self.seq = itertools.count()
+        self.max_pending = max_pending
+        self.keys = OrderedDict()  # idempotency key -> job
+        self.keep_keys = keep_keys
+        self.done = deque(maxlen=keep_done)
+        self.running = None
+        self.closed = False
+
+    def pending(self):
+        return [job for _, _, job in sorted(self.heap) if job.status == "queued"]
+
+    def busy(self):
+        with self.cond:
+            return self.running is not None or bool(self.pending())
+
+    def submit(self, kind, params, key=None):
+        # Returns (job, created); created is False when an existing job was reused
+        with self.cond:
+            if self.closed:
+                raise QueueFull("Feeder has been removed")
+            if key and key in self.keys:
+                return self.keys[key], False
+            job = self._duplicate_of(kind, params)
+            if job is None:
+                if len(self.pending()) >= self.max_pending:
+                    raise QueueFull("Feed queue is full")
+                job = FeedJob(kind, params, key)
+                heapq.heappush(self.heap, (PRIORITIES.get(kind, 1), next(self.seq), job))
+                self.cond.notify()
+                created = True
+            else:
+                created = False
+            if key:
+                self.keys[key] = job
+                while len(self.keys) > self.keep_keys:
+                    self.keys.popitem(last=False)
+            return job, created
+
+    def _duplicate_of(self, kind, params):
+        for _, _, job in self.heap:
+            if job.status == "queued" and job.kind == kind and job.params == params:
+                return job
+        job = self.running
+        if job and job.kind == kind and job.params == params and time.time() - job.started < COALESCE_WINDOW:
+            return job
+        return None
+
+    def get(self):
+        # Blocks the worker until a job is available; None once the queue is closed
+        with self.cond:
+            while True:
+                if self.closed:
+                    return None
+                while self.heap:
+                    _, _, job = heapq.heappop(self.heap)
+                    if job.status == "queued":
+                        job.status = "running"
+                        job.started = time.time()
+                        self.running = job
+                        return job
+                self.cond.wait()
+
+    def finish(self, job, status, result=None):
+        with self.cond:
+            job.status = status
+            job.result = result
+            job.finished = time.time()
+            if self.running is job:
+                self.running = None
+            self.done.append(job)
+
+    def cancel(self, job_id):
+        # Cancels a queued job; returns it, or None if there is no such job
+        with self.cond:
+            for _, _, job in self.heap:
+                if job.id == job_id and job.status == "queued":
+                    job.status = "cancelled"
+                    job.finished = time.time()
+                    self.done.append(job)
+                    return job
+            return None
+
+    def cancel_pending(self):
+        # Cancels everything still queued; returns those jobs
+        with self.cond:
+            jobs = self.pending()
+            for job in jobs:
+                job.status = "cancelled"
+                job.finished = time.time()
+                self.done.append(job)
+            self.heap = []
+            return jobs
+
+    def close(self):
+        # Cancels everything still queued and releases the worker
+        with self.cond:
+            self.cancel_pending()
+            self.closed = True
+            self.cond.notify_all()
+
+    def snapshot(self):
+        with self.cond:
+            return {
+                "running": self.running.to_dict() if self.running else None,
+                "queued": [job.to_dict() for job in self.pending()],
+                "recent": [job.to_dict() for job in reversed(self.done)],
+            }
@@ -0,0 +1,146 @@
+import datetime
+import heapq
+import itertools
+import threading
+import uuid
+
+from clock import SYSTEM_CLOCK
+from metrics import Histogram
+from motor_logic import MAX_STEPS
+
+EVERY_DAY = 0b1111111  # Bit 0 = Monday ... bit 6 = Sunday, like datetime.weekday()
+
+# Upper bound on one sleep. The Pi has no RTC, so the wall clock can jump
+# when NTP syncs after boot; waking hourly at worst keeps us honest.
+MAX_SLEEP = 3600
+
+CATCH_UP_POLICIES = ("skip", "once")
+MAX_CATCH_UP_WINDOW = 7 * 24  # Hours; every weekly slot comes due again within this
+
+FIRE_LAG = Histogram("feeder_scheduler_fire_lag_seconds", "How late a slot fired versus its configured time")
+
+
+def parse_time(value):
+    return datetime.datetime.strptime(value, "%H:%M").time()
+
+
+def make_slot(data):
+    # Validates one feed slot; raises ValueError on bad input
+    parse_time(data["time"])
+    steps = int(data.get("steps", 512))
+    days = int(data.get("days", EVERY_DAY))
+    if not 0 < steps <= MAX_STEPS:
+        raise ValueError(f"steps must be between 1 and {MAX_STEPS}")
+    if not 0 < days <= EVERY_DAY:
+        raise ValueError("days must be a weekday bitmask between 1 and 127")
+    return {
+        "id": data.get("id") or uuid.uuid4().hex[:6],
+        "time": data["time"],
+        "steps": steps,
+        "days": days,
+        "enabled": bool(data.get("enabled", True)),
+        "net": bool(data.get("net", False)),  # steps is food dispensed, not motor travel (see planner.py)
+    }
+
+
+def next_occurrence(slot, after):
+    # First time strictly after `after` that this slot is due
+    at = parse_time(slot["time"])
+    for offset in range(8):
+        day = after.date() + datetime.timedelta(days=offset)
+        when = datetime.datetime.combine(day, at)
+        if when > after and slot["days"] >> day.weekday() & 1:
+            return when
+    return None
+
+
+def last_occurrence(slot, before):
+    # Most recent time at or before `before` that this slot was due
+    at = parse_time(slot["time"])
+    for offset in range(8):
+        day = before.date() - datetime.timedelta(days=offset)
+        when = datetime.datetime.combine(day, at)
+        if when <= before and slot["days"] >> day.weekday() & 1:
+            return when
+    return None
+
+
+class FeedScheduler:
+    # Min-heap of upcoming slot fire times. The thread sleeps on a condition
+    # variable until the earliest deadline or a configuration change, so an
+    # idle feeder never wakes up just to poll.
+    def __init__(self, fire, clock=SYSTEM_CLOCK):
+        self.fire = fire  # fire(slot, due, catch_up) -- must not block
+        self.clock = clock
+        self.cond = threading.Condition()
+        self.heap = []
+        self.seq = itertools.count()
+        self.thread = None
+
+    def configure(self, slots, enabled=True):
+        now = self.clock.now()
+        with self.cond:
+            self.heap = []
+            if enabled:
+                for slot in slots:
+                    if slot.get("enabled", True):
+                        when = next_occurrence(slot, now)
+                        if when:
+                            self.heap.append((when, next(self.seq), slot))
+                heapq.heapify(self.heap)
+            self.cond.notify()
+
+    def catch_up(self, slots, last_run, policy="skip", window_hours=6):
+        # After downtime, fire each slot that came due while we were down
+        # (at most once, and only if still within the window).
+        if policy != "once" or last_run is None:
+            return []
+        now = self.clock.now()
+        missed = []
+        for slot in slots:
+            if not slot.get("enabled", True):
+                continue
+            due = last_occurrence(slot, now)
+            if due and due > last_run and now - due <= datetime.timedelta(hours=window_hours):
+                missed.append((slot, due))
+        for slot, due in missed:
+            self.fire(slot, due, True)
+        return missed
+
+    def next_run(self):
+        with self.cond:
+            return self.heap[0][0] if self.heap else None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while True:
+                    if not self.heap:
+                        self.cond.wait()
+                        continue
+                    when = self.heap[0][0]
+                    delay = (when - self.clock.now()).total_seconds()
+                    if delay <= 0:
+                        break
+                    self.clock.wait(self.cond, min(delay, MAX_SLEEP))
+            # Rechecked under the lock in case slots were reconfigured meanwhile
+            self.fire_next(self.clock.now())
+
+    def fire_next(self, due_by=None):
+        # Fires the earliest slot (if due by `due_by`, when given) and queues
+        # its following occurrence; simulate.py calls this directly
+        with self.cond:
+            if not self.heap or due_by is not None and self.heap[0][0] > due_by:
+                return None
+            when, _, slot = heapq.heappop(self.heap)
+            following = next_occurrence(slot, when)
+            if following:
+                heapq.heappush(self.heap, (following, next(self.seq), slot))
+        FIRE_LAG.observe((self.clock.now() - when).total_seconds())
+        self.fire(slot, when, False)
+        return slot, when
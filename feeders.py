@@ -0,0 +1,114 @@
+import os
+import re
+import threading
+
+import motor_logic
+from feed_journal import FeedJournal
+from feed_queue import FeedQueue
+from feed_scheduler import make_slot
+
+# The original single feeder; its settings live at the top level of the config
+DEFAULT_FEEDER = "main"
+FEEDER_ID = re.compile(r"^[a-z0-9_-]{1,32}$")
+# BCM pins usable as plain outputs on the 40-pin header
+USABLE_PINS = range(2, 28)
+
+
+def make_feeder(data):
+    # Validates one extra feeder definition; raises ValueError on bad input
+    feeder_id = str(data.get("id", "")).lower()
+    if not FEEDER_ID.match(feeder_id) or feeder_id == DEFAULT_FEEDER:
+        raise ValueError("id must be 1-32 of a-z, 0-9, - or _ (and not 'main')")
+    pins = [int(pin) for pin in data["pins"]]
+    if len(pins) != len(motor_logic.PINS) or len(set(pins)) != len(pins):
+        raise ValueError(f"pins must be {len(motor_logic.PINS)} distinct BCM pins")
+    if any(pin not in USABLE_PINS for pin in pins):
+        raise ValueError("pins must be BCM 2-27")
+    profile = motor_logic.make_profile(data.get("start_speed"), data.get("cruise_speed"), data.get("accel"))
+    steps = int(data.get("steps", 512))
+    stutter_fwd = int(data.get("stutter_fwd", 100))
+    stutter_back = int(data.get("stutter_back", 20))
+    motor_logic.check_motion(steps, stutter_fwd, stutter_back)
+    return {
+        "id": feeder_id,
+        "name": str(data.get("name") or feeder_id),
+        "pins": pins,
+        "enabled": bool(data.get("enabled", True)),
+        "steps": steps,
+        "stutter_fwd": stutter_fwd,
+        "stutter_back": stutter_back,
+        "start_speed": profile.start,
+        "cruise_speed": profile.cruise,
+        "accel": profile.accel,
+        "slots": [make_slot(slot) for slot in data.get("slots", [])],
+    }
+
+
+class Feeder:
+    # Everything one motor needs at runtime: its driver, job queue, stop
+    # signal and journal. All feeders share motor_logic's step engine.
+    def __init__(self, feeder_id, driver, journal_path):
+        self.id = feeder_id
+        self.driver = driver
+        self.queue = FeedQueue()
+        self.stop_event = motor_logic.StopEvent()
+        self.journal = FeedJournal(journal_path)
+        self.worker = None
+
+
+class FeederRegistry:
+    def __init__(self, data_dir, run_feed):
+        self.data_dir = data_dir
+        self.run_feed = run_feed  # run_feed(feeder, job), called on the feeder's worker thread
+        self.feeders = {}
+        self.lock = threading.Lock()
+
+    def journal_path(self, feeder_id):
+        if feeder_id == DEFAULT_FEEDER:
+            return os.path.join(self.data_dir, "feed_journal.jsonl")
+        return os.path.join(self.data_dir, f"feed_journal-{feeder_id}.jsonl")
+
+    def get(self, feeder_id):
+        return self.feeders.get(feeder_id)
+
+    def __iter__(self):
+        return iter(list(self.feeders.values()))
+
+    def sync(self, definitions):
+        # definitions: {feeder_id: pins}. Adds new feeders, re-pins idle
+        # ones and retires feeders that are no longer configured.
+        with self.lock:
+            for feeder_id, pins in definitions.items():
+                pins = list(pins)
+                feeder = self.feeders.get(feeder_id)
+                if feeder is None:
+                    feeder = Feeder(feeder_id, self._driver(pins), self.journal_path(feeder_id))
+                    self.feeders[feeder_id] = feeder
+                    feeder.worker = threading.Thread(target=self._work, args=(feeder,), daemon=True)
+                    feeder.worker.start()
+                elif feeder.driver.pins != pins:
+                    if feeder.queue.busy():
+                        print(f"Feeder {feeder_id} is busy, new pins apply on restart")
+                        continue
+                    feeder.driver.close()
+                    feeder.driver = self._driver(pins)
+            for feeder_id in list(self.feeders):
+                if feeder_id not in definitions:
+                    feeder = self.feeders.pop(feeder_id)
+                    feeder.stop_event.set()
+                    feeder.queue.close()
+
+    def _driver(self, pins):
+        # The default pins keep using motor_logic's own driver
+        if pins == motor_logic.PINS:
+            return motor_logic.driver
+        return motor_logic.StepperDriver(pins)
+
+    def _work(self, feeder):
+        # The only thread that ever submits this feeder's motor runs
+        while True:
+            job = feeder.queue.get()
+            if job is None:
+                feeder.driver.close()
+                return
+            self.run_feed(feeder, job)
@@ -0,0 +1,178 @@
+import mmap
+import os
+import time
+from array import array
+
+# Pluggable GPIO backends for the stepper driver. Every backend takes whole
+# BCM bit masks per phase: write(set_mask, clear_mask) drives the pins in
+# set_mask high and the pins in clear_mask low.
+
+BACKEND_ENV = "NACHO_GPIO_BACKEND"
+
+
+def pin_mask(pins):
+    mask = 0
+    for pin in pins:
+        mask |= 1 << pin
+    return mask
+
+
+def mask_pins(mask):
+    return tuple(pin for pin in range(32) if mask >> pin & 1)
+
+
+class RPiBackend:
+    # RPi.GPIO: one library call per changed pin
+    name = "rpi"
+
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        self.pins_for = {}
+
+    def setup(self, pins):
+        GPIO = self.GPIO
+        GPIO.setwarnings(False)
+        GPIO.setmode(GPIO.BCM)
+        for pin in pins:
+            GPIO.setup(pin, GPIO.OUT)
+            GPIO.output(pin, False)
+
+    def write(self, set_mask, clear_mask):
+        output = self.GPIO.output
+        pins_for = self.pins_for
+        if set_mask:
+            pins = pins_for.get(set_mask) or pins_for.setdefault(set_mask, mask_pins(set_mask))
+            for pin in pins:
+                output(pin, 1)
+        if clear_mask:
+            pins = pins_for.get(clear_mask) or pins_for.setdefault(clear_mask, mask_pins(clear_mask))
+            for pin in pins:
+                output(pin, 0)
+
+    def cleanup(self, pins):
+        self.GPIO.cleanup(list(pins))
+
+
+class MockBackend:
+    # Stand-in for local development; discards every write
+    name = "mock"
+
+    def setup(self, pins): pass
+    def write(self, set_mask, clear_mask): pass
+    def cleanup(self, pins): pass
+
+
+class RecordingBackend:
+    # Fake for benchmarks: timestamps every write so the emitted phase
+    # timing and the number of GPIO calls can be checked off-Pi
+    name = "recording"
+
+    def __init__(self):
+        self.times = array('d')
+        self.sets = array('L')
+        self.clears = array('L')
+        self.pins = ()
+
+    def setup(self, pins):
+        self.pins = tuple(pins)
+
+    def write(self, set_mask, clear_mask):
+        self.times.append(time.perf_counter())
+        self.sets.append(set_mask)
+        self.clears.append(clear_mask)
+
+    def cleanup(self, pins): pass
+
+    def pin_changes(self):
+        # Individual pin level changes, i.e. what RPi.GPIO makes one call each for
+        return sum(bin(mask).count("1") for mask in self.sets) + sum(bin(mask).count("1") for mask in self.clears)
+
+
+# BCM2835-family GPIO register block as exposed by /dev/gpiomem
+BLOCK_SIZE = 4096
+GPFSEL0 = 0x00
+GPSET0 = 0x1C
+GPCLR0 = 0x28
+GPLEV0 = 0x34
+
+
+class MmapBackend:
+    # Drives the GPIO registers directly: each phase is a single 32-bit store
+    # to GPSET0 or GPCLR0, so all coil pins change atomically with no
+    # intermediate states. Any file of BLOCK_SIZE bytes can stand in for
+    # /dev/gpiomem off-Pi; the register writes can then be read back.
+    name = "mmap"
+
+    def __init__(self, path="/dev/gpiomem"):
+        self.path = path
+        self.mem = None
+        self.regs = None
+
+    def open(self):
+        if self.mem is not None:
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_SYNC)
+        try:
+            self.mem = mmap.mmap(fd, BLOCK_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        self.regs = memoryview(self.mem).cast('I')
+
+    def set_function(self, pin, function):
+        # 3 bits per pin, 10 pins per GPFSEL register; 0 = input, 1 = output
+        index = GPFSEL0 // 4 + pin // 10
+        shift = (pin % 10) * 3
+        self.regs[index] = (self.regs[index] & ~(7 << shift)) | (function << shift)
+
+    def setup(self, pins):
+        self.open()
+        for pin in pins:
+            self.set_function(pin, 1)
+        self.write(0, pin_mask(pins))
+
+    def write(self, set_mask, clear_mask):
+        regs = self.regs
+        if set_mask:
+            regs[GPSET0 // 4] = set_mask
+        if clear_mask:
+            regs[GPCLR0 // 4] = clear_mask
+
+    def read_register(self, offset):
+        return self.regs[offset // 4]
+
+    def cleanup(self, pins):
+        if self.mem is None:
+            return
+        self.write(0, pin_mask(pins))
+        for pin in pins:
+            self.set_function(pin, 0)
+        self.regs.release()
+        self.mem.close()
+        self.regs = self.mem = None
+
+
+def create_register_file(path):
+    # Zeroed register block for exercising MmapBackend without a Pi
+    with open(path, "wb") as f:
+        f.write(bytes(BLOCK_SIZE))
+    return path
+
+
+def select_backend(name=None):
+    # Backend is chosen at startup via NACHO_GPIO_BACKEND (rpi, mmap, mock, recording);
+    # by default RPi.GPIO is used when available.
+    name = (name or os.environ.get(BACKEND_ENV) or "auto").lower()
+    if name == "mock":
+        return MockBackend()
+    if name == "recording":
+        return RecordingBackend()
+    if name == "mmap":
+        return MmapBackend(os.environ.get("NACHO_GPIOMEM", "/dev/gpiomem"))
+    try:
+        return RPiBackend()
+    except ImportError:
+        if name == "rpi":
+            raise
+        print("RPi.GPIO not found, using mock for local development")
+        return MockBackend()
@@ -0,0 +1,132 @@
+from bisect import bisect_left
+
+# Every metric registers itself here on creation; /metrics renders this list
+REGISTRY = []
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, for anything measured around a GPIO write or a wakeup
+FAST_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+# Seconds, for requests, scheduler wakeups and feeds
+SLOW_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+# Recording never takes a lock, so the step engine can record on every
+# phase without stalling on an HTTP thread that is rendering /metrics. A
+# render may see a histogram mid-update (count one ahead of sum), which is
+# fine for monitoring; the values themselves are only ever written by
+# simple += on the recording side.
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def observe_many(self, values):
+        # For samples already collected elsewhere, e.g. a clock's error array
+        counts = self.counts
+        buckets = self.buckets
+        for value in values:
+            counts[bisect_left(buckets, value)] += 1
+        self.sum += sum(values)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.children = {}
+        registry.append(self)
+        if not self.labelnames:
+            # Unlabelled metrics record straight onto their only child
+            child = self.labels()
+            for method in self.methods:
+                setattr(self, method, getattr(child, method))
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self.children.items()):
+            lines += self._render_child(values, child)
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+    methods = ("inc",)
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {_number(child.value)}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    methods = ("observe", "observe_many")
+
+    def __init__(self, name, help, labels=(), buckets=SLOW_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, values, child):
+        counts = list(child.counts)
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            total += count
+            le = "+Inf" if bound == float("inf") else _number(bound)
+            lines.append(f"{self.name}_bucket{self._label_text(values, [('le', le)])} {total}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {_number(child.sum)}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {total}")
+        return lines
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render(registry=REGISTRY):
+    # Prometheus text exposition format
+    lines = []
+    for metric in registry:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
@@ -1,17 +1,18 @@
-try:
-    import RPi.GPIO as GPIO
-except ImportError:
-    print("RPi.GPIO not found, using mock for local development")
-    class MockGPIO:
-        BCM = "BCM"
-        OUT = "OUT"
-        def setwarnings(self, *args): pass
-        def setmode(self, *args): pass
-        def setup(self, *args): pass
-        def output(self, *args): pass
-        def cleanup(self, *args): pass
-    GPIO = MockGPIO()
+import atexit
+import bisect
+import threading
 import time
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+from gpio_backends import pin_mask, select_backend
+from step_engine import INTERRUPT_AFTER, StepEngine
+
+@lru_cache(maxsize=1)
+def get_backend():
+    # GPIO backend, chosen on first use rather than at import so importing
+    # this module never probes RPi.GPIO (see gpio_backends.select_backend)
+    return select_backend()
 
 PINS = [17, 18, 27, 22]
 # Half-step sequence (8 steps) for smoother movement and higher torque
@@ -26,69 +27,270 @@ SEQUENCE = [
     [1, 0, 0, 1]
 ]
 
+STEP_DELAY = 0.005  # Slower speed = Higher Torque
+REVERSAL_PAUSE = 0.1  # Settle time before and after each reverse phase
+
+# Velocity profile for each forward/reverse run, in half-steps per second.
+# Runs start slow for torque, ramp up to cruise and ramp back down before
+# the reversal. The default (start == cruise) is the classic fixed 5ms delay.
+Profile = namedtuple("Profile", ["start", "cruise", "accel"])
+DEFAULT_PROFILE = Profile(start=1 / STEP_DELAY, cruise=1 / STEP_DELAY, accel=2000.0)
+# Upper limits, matching the sliders on the page
+MAX_SPEED = 1000.0
+MAX_ACCEL = 10000.0
+MAX_STEPS = 10000
+MAX_CYCLE = 1000
+
+# Each half-step is stored as a 4-bit pin-state code (bit i drives PINS[i])
+FORWARD_CODES = [sum(bit << i for i, bit in enumerate(step)) for step in SEQUENCE]
+REVERSE_CODES = FORWARD_CODES[::-1]
+
+# Worst case from a stop request to coils off: one uninterruptible wait
+# plus the release writes. Stops are checked before every phase.
+STOP_LATENCY_BOUND = INTERRUPT_AFTER + 0.005
+
+# Phase timing statistics from the most recent run (see StepClock.stats)
+last_jitter = None
+# Seconds from the last stop request to coils off
+last_stop_latency = None
+
+
+class StopEvent(threading.Event):
+    # Remembers when the stop was requested so the latency can be measured,
+    # and wakes the step engines watching it so a pause ends on the stop itself
+    requested_at = None
+
+    def __init__(self):
+        super().__init__()
+        self.watchers = set()
+
+    def watch(self, wake):
+        self.watchers.add(wake)
+
+    def set(self):
+        self.requested_at = time.perf_counter()
+        super().set()
+        for wake in list(self.watchers):
+            wake()
+
+    def clear(self):
+        self.requested_at = None
+        super().clear()
+
+
+def make_profile(start=None, cruise=None, accel=None):
+    # Raises ValueError on speeds the motor can't sensibly run at; values
+    # above the UI's range are clamped to its top
+    start = _positive("start_speed", start, DEFAULT_PROFILE.start, MAX_SPEED)
+    cruise = max(_positive("cruise_speed", cruise, start, MAX_SPEED), start)
+    accel = _positive("accel", accel, DEFAULT_PROFILE.accel, MAX_ACCEL)
+    return Profile(start, cruise, accel)
+
+
+def _positive(name, value, default, limit):
+    value = float(default if value is None or value == "" else value)
+    if not value > 0:  # Also catches NaN
+        raise ValueError(f"{name} must be positive")
+    return min(value, limit)
+
+
+@lru_cache(maxsize=8)
+def _ramp(profile):
+    # Dwell times while accelerating from start to cruise: v^2 = v0^2 + 2*a*i
+    start, cruise, accel = profile
+    if cruise <= start:
+        return array('d')
+    count = int((cruise * cruise - start * start) / (2 * accel)) + 1
+    return array('d', [1 / min((start * start + 2 * accel * i) ** 0.5, cruise) for i in range(count)])
+
+
+@lru_cache(maxsize=64)
+def segment_dwells(phases, profile=DEFAULT_PROFILE):
+    # Trapezoidal dwell table for one run: ramp up, cruise, mirror ramp down.
+    # Short runs that can't reach cruise become a triangle.
+    ramp = _ramp(profile)
+    cruise = array('d', [1 / profile.cruise])
+    if phases >= 2 * len(ramp):
+        down = array('d', reversed(ramp))
+        return ramp + cruise * (phases - 2 * len(ramp)) + down
+    up = ramp[:(phases + 1) // 2]
+    return up + array('d', reversed(ramp[:phases // 2]))
+
+
+class FeedPlan:
+    # A feed compiled down to a flat list of phases: codes[i] is written,
+    # then the motor dwells for dwells[i] seconds (reversal pauses included).
+    def __init__(self, codes, dwells, segments, lead_in=0.0, source=None):
+        self.codes = codes
+        self.dwells = dwells
+        self.segments = segments  # (first phase, direction, steps) per forward/reverse run
+        self.lead_in = lead_in  # Pause before the first phase (reverse-only cycles)
+        self.duration = lead_in + sum(dwells)
+        self.source = source  # compile_plan arguments, enough to rebuild it in another process
+
+    @property
+    def steps(self):
+        return len(self.codes) // len(SEQUENCE)
+
+    def direction_at(self, phase):
+        if not self.segments:
+            return None
+        index = bisect.bisect_right(self.segments, (phase, "~")) - 1
+        return self.segments[max(index, 0)][1]
+
+
+def check_motion(steps, cycle_fwd, cycle_back):
+    # Raises ValueError on a feed that would never finish or is too big to plan
+    if not 0 <= steps <= MAX_STEPS:
+        raise ValueError(f"steps must be between 0 and {MAX_STEPS}")
+    if not (0 <= cycle_fwd <= MAX_CYCLE and 0 <= cycle_back <= MAX_CYCLE):
+        raise ValueError(f"cycle_fwd and cycle_back must be between 0 and {MAX_CYCLE}")
+    if cycle_fwd == 0 and cycle_back == 0:
+        raise ValueError("cycle_fwd and cycle_back can't both be 0")
+
+
+@lru_cache(maxsize=16)
+def compile_plan(steps, cycle_fwd=100, cycle_back=20, profile=DEFAULT_PROFILE):
+    # "Always Stutter" / Cycle Logic
+    # Movement is dictated by cycle_fwd vs cycle_back ratios; reverse steps
+    # count towards the total just like forward ones.
+    # If both are 0, default to standard forward to prevent infinite loop/no-op
+    if cycle_fwd == 0 and cycle_back == 0:
+        cycle_fwd = 100
+    check_motion(steps, cycle_fwd, cycle_back)
+
+    codes = array('B')
+    dwells = array('d')
+    segments = []
+    lead_in = 0.0
+    forward = array('B', FORWARD_CODES)
+    reverse = array('B', REVERSE_CODES)
+
+    def add(pattern, count, direction):
+        segments.append((len(codes), direction, count))
+        codes.extend(pattern * count)
+        dwells.extend(segment_dwells(count * len(pattern), profile))
+
+    def pause():
+        nonlocal lead_in
+        if dwells:
+            dwells[-1] += REVERSAL_PAUSE
+        else:
+            lead_in += REVERSAL_PAUSE
+
+    total_run = 0
+    while total_run < steps:
+        # --- Forward Phase ---
+        to_move = min(cycle_fwd, steps - total_run)
+        if to_move > 0:
+            add(forward, to_move, "forward")
+            total_run += to_move
+
+        # Break if done
+        if total_run >= steps: break
+
+        # --- Reverse Phase ---
+        to_move = min(cycle_back, steps - total_run)
+        if to_move > 0:
+            pause()  # Small pause before reversing direction
+            add(reverse, to_move, "reverse")
+            total_run += to_move
+            pause()  # Pause after reverse
+
+    return FeedPlan(codes, dwells, segments, lead_in, (steps, cycle_fwd, cycle_back, profile))
+
+
+class StepperDriver:
+    # Long-lived handle on one motor's coil pins. GPIO is configured once,
+    # the current coil state is tracked, and each phase only writes the pins
+    # that differ from it (one pin per half-step in SEQUENCE).
+    def __init__(self, pins=PINS, gpio=None):
+        self.pins = list(pins)
+        self.gpio = gpio  # None: the shared backend, resolved in setup()
+        self.state = 0
+        self.ready = False
+        self.last_jitter = None
+        self.last_stop_latency = None
+        codes = range(1 << len(self.pins))
+        # transitions[old][new] -> (set_mask, clear_mask) taking old to new
+        self.transitions = [
+            [
+                (pin_mask(pin for i, pin in enumerate(self.pins) if (new & ~old) >> i & 1),
+                 pin_mask(pin for i, pin in enumerate(self.pins) if (old & ~new) >> i & 1))
+                for new in codes
+            ]
+            for old in codes
+        ]
+
+    def setup(self):
+        if self.ready:
+            return
+        self.gpio = self.gpio or get_backend()
+        self.gpio.setup(self.pins)
+        self.state = 0
+        self.ready = True
+        atexit.register(self.close)
+
+    def apply(self, code):
+        self.gpio.write(*self.transitions[self.state][code])
+        self.state = code
+
+    def release(self):
+        # Turn off coils to save 9V battery; GPIO stays configured for the next feed
+        self.apply(0)
+
+    def close(self):
+        if not self.ready:
+            return
+        self.release()
+        self.gpio.cleanup(self.pins)
+        self.ready = False
+
+
+driver = StepperDriver()
+# One timing loop shared by every motor in the process (replaced by
+# motor_process.install() when stepping runs in a child process)
+engine = StepEngine()
+
+
+def run_motor(steps, direction="forward", stutter=False, cycle_fwd=100, cycle_back=20, stop_event=None, profile=DEFAULT_PROFILE, stepper=None, progress=None, progress_interval=0.25, step_engine=None):
+    # Blocks until the feed is done or stopped; returns the whole steps completed.
+    # progress(phases_done, elapsed) is called at most once per progress_interval.
+    global last_jitter, last_stop_latency
+    # The 'direction' param is largely ignored now;
+    # actual movement is dictated by cycle_fwd vs cycle_back ratios.
+    plan = compile_plan(steps, cycle_fwd, cycle_back, profile)
+    stepper = stepper or driver
+    step_engine = step_engine or engine  # e.g. a StepEngine on a VirtualClock
 
-def run_motor(steps, direction="forward", stutter=False, cycle_fwd=100, cycle_back=20, stop_event=None):
-    GPIO.setwarnings(False)
-    GPIO.setmode(GPIO.BCM)
-    for pin in PINS:
-        GPIO.setup(pin, GPIO.OUT)
-    
-    try:
-        # "Always Stutter" / Cycle Logic
-        # The 'direction' param is largely ignored now; 
-        # actual movement is dictated by cycle_fwd vs cycle_back ratios.
-        
-        total_run = 0
-        
-        # If both are 0, default to standard forward to prevent infinite loop/no-op
-        if cycle_fwd == 0 and cycle_back == 0:
-            cycle_fwd = 100
-
-        while total_run < steps:
-            if stop_event and stop_event.is_set(): return
-            
-            # --- Forward Phase ---
-            remaining = steps - total_run
-            if remaining <= 0: break
-            
-            to_move = min(cycle_fwd, remaining)
-            if to_move > 0:
-                _move_raw(to_move, "forward", stop_event)
-                total_run += to_move
-                if stop_event and stop_event.is_set(): return
-            
-            # Break if done
-            if total_run >= steps: break
-            
-            # --- Reverse Phase ---
-            remaining = steps - total_run
-            if remaining <= 0: break
-            
-            to_move = min(cycle_back, remaining)
-            if to_move > 0:
-                # Small pause before reversing direction
-                time.sleep(0.1)
-                _move_raw(to_move, "reverse", stop_event)
-                total_run += to_move
-                if stop_event and stop_event.is_set(): return
-                time.sleep(0.1) # Pause after reverse
-                
-    finally:
-        # Turn off pins to save 9V battery
-        for pin in PINS:
-            GPIO.output(pin, False)
-        GPIO.cleanup()
-
-def _move_raw(steps, direction, stop_event=None):
-    # Reverse sequence if direction is 'reverse'
-    seq = SEQUENCE if direction == "forward" else list(reversed(SEQUENCE))
-    
-    for _ in range(steps):
-        if stop_event and stop_event.is_set(): return
-        for step in seq:
-            for i in range(4):
-                GPIO.output(PINS[i], step[i])
-            time.sleep(0.005) # Slower speed = Higher Torque
+    run = step_engine.play(plan, stepper, stop_event, progress, progress_interval)
+    last_jitter = stepper.last_jitter = run.jitter
+    if run.stop_latency is not None:
+        last_stop_latency = stepper.last_stop_latency = run.stop_latency
+        if run.stop_latency > STOP_LATENCY_BOUND:
+            print(f"Stop took {run.stop_latency * 1000:.1f}ms (bound {STOP_LATENCY_BOUND * 1000:.0f}ms)")
+    if run.error is not None:
+        raise run.error
+    return run.steps
 
 
+if __name__ == '__main__':
+    # Quick off-Pi speed check against the mock GPIO, e.g.
+    #   python motor_logic.py 2000 --cruise 400 --accel 4000
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("steps", type=int)
+    parser.add_argument("--fwd", type=int, default=100)
+    parser.add_argument("--back", type=int, default=20)
+    parser.add_argument("--start", type=float)
+    parser.add_argument("--cruise", type=float)
+    parser.add_argument("--accel", type=float)
+    args = parser.parse_args()
 
+    profile = make_profile(args.start, args.cruise, args.accel)
+    plan = compile_plan(args.steps, args.fwd, args.back, profile)
+    began = time.perf_counter()
+    done = run_motor(args.steps, cycle_fwd=args.fwd, cycle_back=args.back, profile=profile)
+    elapsed = time.perf_counter() - began
+    print(f"{done} steps in {elapsed:.2f}s (planned {plan.duration:.2f}s, {done / elapsed:.1f} steps/s)")
+    print(f"Jitter: {last_jitter}")
@@ -0,0 +1,384 @@
+import atexit
+import itertools
+import math
+import multiprocessing
+import os
+import signal
+import struct
+import threading
+import time
+
+import metrics
+import motor_logic
+from step_engine import PHASES_PER_STEP, RESYNCS, STEPS, STOP_LATENCY, Run, StepEngine
+
+# Optional out-of-process stepping (NACHO_MOTOR_MODE=process). A child
+# process owns the GPIO pins and runs its own StepEngine, so nothing the web
+# server or scheduler does in this process can hold the GIL while a phase is
+# due. The two sides only share one block of memory:
+#   - a command ring (this process -> child): play a feed
+#   - a telemetry ring (child -> this process): progress and results
+#   - one stop slot per run, read by the child's engine before every phase
+#   - a heartbeat the child bumps while its command loop is alive
+# Each ring has one writer and one reader, so neither side ever takes a lock
+# on it. A supervisor thread here reads telemetry, and if the child dies or
+# hangs it fails the runs in flight, turns their coils off and respawns it.
+MOTOR_MODE_ENV = "NACHO_MOTOR_MODE"  # thread (default) or process
+
+POLL = 0.002  # Child command loop and supervisor period while feeds are running
+IDLE_POLL = 0.1  # Their period while idle, which is also the most a feed waits to start
+HUNG_AFTER = 2.0  # Heartbeat age at which the child is considered stuck
+RESPAWN_BACKOFF = 5.0  # Wait before restarting a child that died before its first heartbeat
+RING_SLOTS = 64
+STOP_SLOTS = 32  # Runs in flight at once, at most
+
+PLAY, QUIT = 1, 2
+PROGRESS, DONE = 1, 2
+
+# op, run id, pins, steps, cycle_fwd, cycle_back, start, cruise, accel, progress_interval
+COMMAND = struct.Struct("<BxxxI4BIIIdddd")
+# op, run id, phases done, elapsed / stop latency, resyncs, jitter p50/p99/max ms, error
+TELEMETRY = struct.Struct("<BxxxIIIdddd64s")
+COUNTER = struct.Struct("<Q")
+STAMP = struct.Struct("<d")
+
+
+RESPAWNS = metrics.Counter(
+    "feeder_motor_process_restarts_total", "Times the motor process died or hung and was restarted", labels=("reason",)
+)
+
+
+class MotorProcessError(Exception):
+    pass
+
+
+class Ring:
+    # Single-producer, single-consumer ring of fixed-size records. The writer
+    # only advances `head` and the reader only advances `tail`; a record is
+    # written before the head that publishes it. put() returns False when full.
+    def __init__(self, buffer, offset, record, slots=RING_SLOTS):
+        self.buffer = buffer
+        self.head = offset
+        self.tail = offset + COUNTER.size
+        self.data = offset + 2 * COUNTER.size
+        self.record = record
+        self.slots = slots
+
+    @staticmethod
+    def size(record, slots=RING_SLOTS):
+        return 2 * COUNTER.size + record.size * slots
+
+    def reset(self):
+        COUNTER.pack_into(self.buffer, self.head, 0)
+        COUNTER.pack_into(self.buffer, self.tail, 0)
+
+    def put(self, *values):
+        head = COUNTER.unpack_from(self.buffer, self.head)[0]
+        if head - COUNTER.unpack_from(self.buffer, self.tail)[0] >= self.slots:
+            return False
+        self.record.pack_into(self.buffer, self.data + head % self.slots * self.record.size, *values)
+        COUNTER.pack_into(self.buffer, self.head, head + 1)
+        return True
+
+    def get(self):
+        tail = COUNTER.unpack_from(self.buffer, self.tail)[0]
+        if tail == COUNTER.unpack_from(self.buffer, self.head)[0]:
+            return None
+        values = self.record.unpack_from(self.buffer, self.data + tail % self.slots * self.record.size)
+        COUNTER.pack_into(self.buffer, self.tail, tail + 1)
+        return values
+
+
+class Layout:
+    # Where everything lives in the shared block; both processes build the same one
+    SIZE = Ring.size(COMMAND) + Ring.size(TELEMETRY) + STAMP.size * (1 + STOP_SLOTS)
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        offset = 0
+        self.commands = Ring(buffer, offset, COMMAND)
+        offset += Ring.size(COMMAND)
+        self.telemetry = Ring(buffer, offset, TELEMETRY)
+        offset += Ring.size(TELEMETRY)
+        self.heartbeat = offset
+        offset += STAMP.size
+        self.stops = offset  # perf_counter() of the stop request per slot, 0.0 while running
+
+    def stop_offset(self, run_id):
+        return self.stops + run_id % STOP_SLOTS * STAMP.size
+
+    def reset(self):
+        self.commands.reset()
+        self.telemetry.reset()
+        STAMP.pack_into(self.buffer, self.heartbeat, 0.0)  # Not checked until the new child's first beat
+
+
+class SharedStop:
+    # Stands in for a StopEvent on the child's side: the engine checks
+    # is_set() before every phase, which is a plain read of shared memory.
+    # The parent can't wake the child's engine directly, so the command loop
+    # calls poll() and passes the wake-up on.
+    def __init__(self, buffer, offset):
+        self.buffer = buffer
+        self.offset = offset
+        self.watchers = set()
+
+    def watch(self, wake):
+        self.watchers.add(wake)
+
+    def poll(self):
+        if self.watchers and self.is_set():
+            for wake in self.watchers:
+                wake()
+            self.watchers.clear()
+
+    @property
+    def requested_at(self):
+        return STAMP.unpack_from(self.buffer, self.offset)[0] or None
+
+    def is_set(self):
+        return STAMP.unpack_from(self.buffer, self.offset)[0] != 0.0
+
+
+def exit_cleanly(signum, frame):
+    raise SystemExit(0)  # Unwinds through child_main's finally, releasing the coils
+
+
+def child_main(shared, parent_pid):
+    # Entry point of the motor process
+    signal.signal(signal.SIGTERM, exit_cleanly)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is for the parent, which stops us cleanly
+    layout = Layout(shared)
+    engine = StepEngine()
+    drivers = {}  # pins -> StepperDriver
+    runs = {}  # run id -> [Run, last phase reported]
+    latest = {}  # run id -> (phases done, elapsed), written by the engine thread
+
+    def reporter(run_id):
+        def report(phase, elapsed):
+            latest[run_id] = (phase, elapsed)
+        return report
+
+    try:
+        while os.getppid() == parent_pid:
+            STAMP.pack_into(shared, layout.heartbeat, time.perf_counter())
+            command = layout.commands.get()
+            while command is not None:
+                op, run_id, pin0, pin1, pin2, pin3, steps, cycle_fwd, cycle_back, start, cruise, accel, interval = command
+                if op == QUIT:
+                    return
+                pins = (pin0, pin1, pin2, pin3)
+                if pins not in drivers:
+                    drivers[pins] = motor_logic.StepperDriver(pins)
+                plan = motor_logic.compile_plan(steps, cycle_fwd, cycle_back, motor_logic.Profile(start, cruise, accel))
+                stop = SharedStop(shared, layout.stop_offset(run_id))
+                run = Run(plan, drivers[pins], stop, reporter(run_id), interval)
+                runs[run_id] = [run, -1]
+                try:
+                    engine.start(run)
+                except Exception as e:
+                    run.error = e
+                    run.done.set()
+                command = layout.commands.get()
+            for run_id, entry in list(runs.items()):
+                run, reported = entry
+                if run.done.is_set():
+                    jitter = run.jitter or {}
+                    error = f"{type(run.error).__name__}: {run.error}".encode()[:64] if run.error is not None else b""
+                    stop_latency = run.stop_latency if run.stop_latency is not None else math.nan
+                    if layout.telemetry.put(
+                        DONE, run_id, run.steps, run.clock.resyncs, stop_latency,
+                        jitter.get("p50_ms", math.nan), jitter.get("p99_ms", math.nan), jitter.get("max_ms", math.nan),
+                        error
+                    ):
+                        del runs[run_id]
+                        latest.pop(run_id, None)
+                    continue
+                run.stop_event.poll()
+                if run_id in latest and latest[run_id][0] != reported:
+                    phase, elapsed = latest[run_id]
+                    if layout.telemetry.put(PROGRESS, run_id, phase, 0, elapsed, 0.0, 0.0, 0.0, b""):
+                        entry[1] = phase
+            time.sleep(POLL if runs else IDLE_POLL)
+    finally:
+        for driver in drivers.values():
+            driver.close()
+
+
+class RemoteRun:
+    # The parent's view of a run playing in the child; has the fields
+    # run_motor reads from a step_engine.Run
+    def __init__(self, run_id, plan, driver, stop_event, progress):
+        self.id = run_id
+        self.plan = plan
+        self.driver = driver
+        self.stop_event = stop_event
+        self.progress = progress
+        self.phases = 0
+        self.steps = 0
+        self.stop_latency = None
+        self.jitter = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class ProcessStepEngine:
+    # Drop-in for StepEngine.play() that plays feeds in the motor process
+    virtual = False
+
+    def __init__(self):
+        self.shared = multiprocessing.RawArray("B", Layout.SIZE)
+        self.layout = Layout(self.shared)
+        self.context = multiprocessing.get_context("spawn")  # Forking a threaded server is unsafe
+        self.lock = threading.Lock()  # Serialises this process's writes to the command ring
+        self.runs = {}  # run id -> RemoteRun
+        self.pins = set()  # Every pin set the child has driven
+        self.ids = itertools.count(1)
+        self.process = None
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.process is None:
+                self._spawn()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._supervise, name="motor-supervisor", daemon=True)
+                self.thread.start()
+
+    def play(self, plan, driver, stop_event=None, progress=None, progress_interval=0.25):
+        # Blocks the caller until the run finishes, is stopped or the child dies
+        if plan.source is None:
+            raise ValueError("Only plans from compile_plan can be played in the motor process")
+        self.start()
+        steps, cycle_fwd, cycle_back, profile = plan.source
+        with self.lock:
+            if len(self.runs) >= STOP_SLOTS:
+                raise MotorProcessError("Too many feeds running at once")
+            run_id = next(self.ids)
+            while run_id % STOP_SLOTS in {other % STOP_SLOTS for other in self.runs}:
+                run_id = next(self.ids)
+            run = RemoteRun(run_id, plan, driver, stop_event, progress)
+            STAMP.pack_into(self.layout.buffer, self.layout.stop_offset(run_id), 0.0)
+            try:
+                sent = self.layout.commands.put(
+                    PLAY, run_id, *driver.pins, steps, cycle_fwd, cycle_back,
+                    profile.start, profile.cruise, profile.accel, progress_interval
+                )
+            except struct.error as e:
+                raise MotorProcessError(f"Feed can't be sent to the motor process: {e}")
+            if not sent:
+                raise MotorProcessError("Motor process is not keeping up with commands")
+            # Only tracked once the child has it, so a failed send leaves nothing behind
+            self.runs[run_id] = run
+            self.pins.add(tuple(driver.pins))
+        if stop_event is not None:
+            while not run.done.is_set():
+                if stop_event.wait(0.05):
+                    requested_at = getattr(stop_event, "requested_at", None) or time.perf_counter()
+                    STAMP.pack_into(self.layout.buffer, self.layout.stop_offset(run_id), requested_at)
+                    break
+        run.done.wait()
+        return run
+
+    def close(self):
+        with self.lock:
+            process, self.process = self.process, None
+            # Under the lock like every other write to the command ring
+            if process is not None and process.is_alive():
+                self.layout.commands.put(QUIT, 0, 0, 0, 0, 0, 0, 0, 0, 0.0, 0.0, 0.0, 0.0)
+        if process is not None and process.is_alive():
+            process.join(2.0)
+            if process.is_alive():
+                process.terminate()
+
+    def _spawn(self):
+        # Called with the lock held and no child running
+        self.layout.reset()
+        self.process = self.context.Process(
+            target=child_main, args=(self.shared, os.getpid()), name="nacho-motor", daemon=True
+        )
+        self.process.start()
+        print(f"Motor process started (pid {self.process.pid})")
+
+    def _supervise(self):
+        while True:
+            record = self.layout.telemetry.get()
+            if record is not None:
+                self._receive(*record)
+                continue
+            process = self.process
+            if process is None:
+                return  # Closed
+            heartbeat = STAMP.unpack_from(self.layout.buffer, self.layout.heartbeat)[0]
+            if not process.is_alive():
+                self._recover(f"Motor process died (exit code {process.exitcode})", "died")
+            elif heartbeat and time.perf_counter() - heartbeat > HUNG_AFTER:
+                process.kill()
+                process.join()
+                self._recover("Motor process stopped responding", "hung")
+            time.sleep(POLL if self.runs else IDLE_POLL)
+
+    def _receive(self, op, run_id, phases, resyncs, value, p50, p99, worst, error):
+        run = self.runs.get(run_id)
+        if run is None:
+            return
+        if op == PROGRESS:
+            run.phases = phases
+            if run.progress:
+                run.progress(phases, value)
+            return
+        # DONE: phases carries the whole steps completed
+        run.steps = phases
+        if not math.isnan(value):
+            run.stop_latency = value
+            STOP_LATENCY.observe(value)
+        if not math.isnan(p50):
+            run.jitter = {"p50_ms": p50, "p99_ms": p99, "max_ms": worst, "resyncs": resyncs}
+        error = error.rstrip(b"\0")
+        if error:
+            run.error = MotorProcessError(error.decode(errors="replace"))
+        STEPS.inc(run.steps)
+        RESYNCS.inc(resyncs)
+        with self.lock:
+            self.runs.pop(run_id, None)
+        run.done.set()
+
+    def _recover(self, reason, label):
+        print(f"{reason}, turning coils off and restarting it")
+        with self.lock:
+            runs, self.runs = self.runs, {}
+            self.process = None
+            # The child can't release the coils any more, so do it from here
+            for pins in self.pins:
+                try:
+                    driver = motor_logic.StepperDriver(pins)
+                    driver.setup()
+                    driver.close()
+                except Exception as e:
+                    print(f"Couldn't release pins {list(pins)}: {e}")
+        for run in runs.values():
+            run.steps = run.phases // PHASES_PER_STEP
+            run.error = MotorProcessError(reason)
+            run.done.set()
+        if not STAMP.unpack_from(self.layout.buffer, self.layout.heartbeat)[0]:
+            time.sleep(RESPAWN_BACKOFF)  # It never got going; don't spin if it dies on start
+        with self.lock:
+            RESPAWNS.labels(label).inc()
+            if self.process is None:  # A feed may already have started a new one
+                self._spawn()
+
+
+def install():
+    # Called once at startup: switches run_motor over to the motor process
+    # when NACHO_MOTOR_MODE=process, and starts the child straight away so
+    # the first feed doesn't wait for it to boot
+    mode = os.environ.get(MOTOR_MODE_ENV, "thread").lower()
+    if mode == "thread":
+        return None
+    if mode != "process":
+        raise SystemExit(f"Unknown {MOTOR_MODE_ENV} '{mode}' (thread or process)")
+    engine = ProcessStepEngine()
+    engine.start()
+    atexit.register(engine.close)
+    motor_logic.engine = engine
+    return engine
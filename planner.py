@@ -0,0 +1,105 @@
+import math
+from functools import lru_cache
+
+from motor_logic import DEFAULT_PROFILE, MAX_CYCLE, MAX_STEPS, REVERSAL_PAUSE, SEQUENCE, check_motion, segment_dwells
+
+# Works out what a feed will do without driving (or even compiling) it.
+# `steps` counts reverse steps too, so the food actually dispensed is the
+# net forward travel, which is usually well below the slider value.
+
+
+@lru_cache(maxsize=1024)
+def segment_time(steps, profile=DEFAULT_PROFILE):
+    # Seconds for one forward or reverse run of `steps`, ramps included
+    return sum(segment_dwells(steps * len(SEQUENCE), profile))
+
+
+def cycle_segments(steps, cycle_fwd=100, cycle_back=20):
+    # (direction, steps) runs in the order run_motor makes them; mirrors
+    # motor_logic.compile_plan without building the phase tables
+    if cycle_fwd == 0 and cycle_back == 0:
+        cycle_fwd = 100
+    check_motion(steps, cycle_fwd, cycle_back)
+    total = 0
+    while total < steps:
+        to_move = min(cycle_fwd, steps - total)
+        if to_move > 0:
+            yield "forward", to_move
+            total += to_move
+        if total >= steps:
+            break
+        to_move = min(cycle_back, steps - total)
+        if to_move > 0:
+            yield "reverse", to_move
+            total += to_move
+
+
+def estimate(steps, cycle_fwd=100, cycle_back=20, profile=DEFAULT_PROFILE):
+    forward = reverse = reversals = 0
+    run = longest = 0  # Consecutive forward steps, i.e. with no reversal in between
+    duration = 0.0
+    for direction, count in cycle_segments(steps, cycle_fwd, cycle_back):
+        duration += segment_time(count, profile)
+        if direction == "forward":
+            forward += count
+            run += count
+            longest = max(longest, run)
+        else:
+            reverse += count
+            reversals += 1
+            run = 0
+            duration += 2 * REVERSAL_PAUSE  # Pause before and after each reverse run
+    return {
+        "steps": steps,
+        "cycle_fwd": cycle_fwd,
+        "cycle_back": cycle_back,
+        "net_steps": forward - reverse,
+        "forward_steps": forward,
+        "reverse_steps": reverse,
+        "reversals": reversals,
+        "max_forward_run": longest,
+        "duration": round(duration, 3),
+    }
+
+
+def steps_for_net(net, cycle_fwd, cycle_back):
+    # Total `steps` whose stutter pattern ends exactly `net` steps forward,
+    # or None if the pattern never gets there
+    if net <= 0:
+        return 0
+    if cycle_back == 0:
+        return net
+    if cycle_fwd <= cycle_back:
+        return None
+    if net <= cycle_fwd:
+        return net
+    # Full forward/back cycles first, then a final forward run of at most cycle_fwd
+    cycles = math.ceil((net - cycle_fwd) / (cycle_fwd - cycle_back))
+    return cycles * (cycle_fwd + cycle_back) + net - cycles * (cycle_fwd - cycle_back)
+
+
+def optimize(net, max_forward, cycle_back=20, profile=DEFAULT_PROFILE):
+    # Fastest stutter settings that dispense `net` steps while never running
+    # forward more than `max_forward` steps without a reverse of `cycle_back`.
+    # Longer forward runs mean fewer reversals, but the last run is whatever
+    # is left over, so a slightly shorter cycle can end up quicker overall.
+    if not 0 < max_forward <= MAX_CYCLE:
+        raise ValueError(f"max_forward must be between 1 and {MAX_CYCLE}")
+    if not 0 <= net <= MAX_STEPS:
+        raise ValueError(f"net_steps must be between 0 and {MAX_STEPS}")
+    if net <= max_forward:
+        return estimate(net, max_forward, cycle_back, profile)
+    if cycle_back == 0 or max_forward <= cycle_back:
+        raise ValueError("max_forward must be larger than cycle_back, and cycle_back above 0")
+    best = None
+    # Longest cycles first, so on a tie the fewest reversals win
+    for cycle_fwd in range(max_forward, cycle_back, -1):
+        steps = steps_for_net(net, cycle_fwd, cycle_back)
+        if steps > MAX_STEPS:
+            continue  # Too many short cycles to plan
+        plan = estimate(steps, cycle_fwd, cycle_back, profile)
+        if best is None or plan["duration"] < best["duration"]:
+            best = plan
+    if best is None:
+        raise ValueError(f"net_steps needs more than {MAX_STEPS} steps with these settings")
+    return best
@@ -0,0 +1,77 @@
+import os
+import threading
+
+# Keeps web traffic from stretching the motor's half-step timing: the step
+# engine's thread asks for real-time (or at least higher) priority and, on
+# multi-core Pis, a CPU of its own, while request workers drop their
+# priority and stay off that CPU. Everything here is best effort and
+# Linux-only; elsewhere, or without CAP_SYS_NICE, it quietly does less.
+
+MOTOR_PRIORITY_ENV = "NACHO_MOTOR_PRIORITY"  # fifo (default), nice or off
+MOTOR_CPU_ENV = "NACHO_MOTOR_CPU"  # CPU number, or "none"; default: the last CPU on multi-core
+FIFO_PRIORITY = 10
+MOTOR_NICE = -10
+WORKER_NICE = 5
+
+
+def available_cpus():
+    if not hasattr(os, "sched_getaffinity"):
+        return []
+    return sorted(os.sched_getaffinity(0))
+
+
+def motor_cpu():
+    setting = os.environ.get(MOTOR_CPU_ENV, "").lower()
+    cpus = available_cpus()
+    if setting == "none":
+        return None
+    if setting:
+        return int(setting)
+    # A single core has nothing to spare
+    return cpus[-1] if len(cpus) > 1 else None
+
+
+def elevate_motor_thread():
+    # Call on the step engine's own thread; returns what was applied
+    applied = []
+    mode = os.environ.get(MOTOR_PRIORITY_ENV, "fifo").lower()
+    if mode == "off":
+        return applied
+    if mode == "fifo":
+        try:
+            # pid 0 is the calling thread for the sched_* calls on Linux
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(FIFO_PRIORITY))
+            applied.append(f"SCHED_FIFO {FIFO_PRIORITY}")
+        except (AttributeError, OSError):
+            mode = "nice"
+    if mode == "nice":
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), MOTOR_NICE)
+            applied.append(f"nice {MOTOR_NICE}")
+        except (AttributeError, OSError):
+            pass
+    cpu = motor_cpu()
+    if cpu is not None:
+        try:
+            os.sched_setaffinity(0, {cpu})
+            applied.append(f"CPU {cpu}")
+        except (AttributeError, OSError):
+            pass
+    return applied
+
+
+def lower_worker_thread():
+    # Call on each request worker thread. Raising our own nice value needs
+    # no privileges, so this works even when the motor thread couldn't be
+    # elevated.
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), WORKER_NICE)
+    except (AttributeError, OSError):
+        pass
+    cpu = motor_cpu()
+    others = set(available_cpus()) - {cpu}
+    if cpu is not None and others:
+        try:
+            os.sched_setaffinity(0, others)
+        except (AttributeError, OSError):
+            pass
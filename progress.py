@@ -0,0 +1,64 @@
+import json
+import threading
+import time
+from collections import deque
+
+# Event types that end a feed; these are always delivered, while runs of
+# "progress" events are coalesced down to the newest one per feeder.
+FINAL_EVENTS = ("complete", "stopped", "error")
+
+
+class ProgressHub:
+    # Fans feed events out to every Server-Sent Events subscriber. Publishing
+    # never blocks on a slow client: subscribers just read from a short
+    # shared backlog at their own pace.
+    def __init__(self, rate=4.0, backlog=64, keepalive=15.0):
+        self.rate = rate  # Max events per second sent to each subscriber
+        self.keepalive = keepalive
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.events = deque(maxlen=backlog)  # (seq, event)
+        self.current = {}  # feeder -> latest event of its feed in progress, for late joiners
+
+    def publish(self, event):
+        with self.cond:
+            self.seq += 1
+            self.events.append((self.seq, event))
+            if event["type"] in FINAL_EVENTS:
+                self.current.pop(event.get("feeder"), None)
+            else:
+                self.current[event.get("feeder")] = event
+            self.cond.notify_all()
+
+    def _since(self, seen):
+        pending = [event for seq, event in self.events if seq > seen]
+        latest = {}
+        for event in pending:
+            if event["type"] == "progress":
+                latest[event.get("feeder")] = event
+        return [
+            event for event in pending
+            if event["type"] != "progress" or event is latest[event.get("feeder")]
+        ]
+
+    def stream(self):
+        # Generator of SSE-formatted messages for one client
+        with self.cond:
+            seen = self.seq
+            current = list(self.current.values())
+        yield "retry: 3000\n\n"
+        for event in current:
+            yield "data: " + json.dumps(event) + "\n\n"
+        interval = 1.0 / self.rate
+        while True:
+            with self.cond:
+                if self.seq == seen:
+                    self.cond.wait(self.keepalive)
+                events = self._since(seen)
+                seen = self.seq
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                yield "data: " + json.dumps(event) + "\n\n"
+            time.sleep(interval)
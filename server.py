@@ -0,0 +1,155 @@
+import os
+import queue
+import socket
+import threading
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler, run_simple
+
+import metrics
+from priority import lower_worker_thread
+
+# Serving modes, chosen with NACHO_SERVER:
+#   threaded (default) - fixed pool of request workers with a short wait
+#                        queue; anything beyond that gets a 503 at once
+#   asgi               - uvicorn in front of the app (pip install uvicorn a2wsgi)
+#   dev                - Flask's development server, unbounded threads
+SERVER_ENV = "NACHO_SERVER"
+WORKERS_ENV = "NACHO_WORKERS"
+BACKLOG_ENV = "NACHO_BACKLOG"
+STREAMS_ENV = "NACHO_MAX_STREAMS"
+
+# Long-lived /events streams get their own threads, so open pages can't tie
+# up the request workers; this caps how many
+STREAM_PATH = b"/events"
+
+# An accepted connection must start its request within PEEK_TIMEOUT or it is
+# dropped (browser preconnects, stalled clients), and no single read or write
+# while handling it may block longer than REQUEST_TIMEOUT
+PEEK_TIMEOUT = 1.0
+REQUEST_TIMEOUT = 10.0
+
+REJECTED = metrics.Counter(
+    "feeder_http_rejected_total", "Requests turned away with a 503 because the server was saturated", labels=("reason",)
+)
+
+BUSY_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Retry-After: 1\r\n"
+    b"Content-Length: 12\r\n"
+    b"Connection: close\r\n\r\n"
+    b"Server busy\n"
+)
+
+
+class TimedRequestHandler(WSGIRequestHandler):
+    # socketserver applies this to the connection in setup()
+    timeout = REQUEST_TIMEOUT
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    # The accept loop only queues connections. A fixed set of worker threads
+    # (at lowered priority, see priority.py) handles them, one request per
+    # connection; when the queue is full the client gets a 503 straight
+    # from the accept loop instead of waiting.
+    multithread = True
+
+    def __init__(self, host, port, app, workers=4, backlog=16, max_streams=4):
+        super().__init__(host, port, app, handler=TimedRequestHandler)
+        self.jobs = queue.Queue(maxsize=backlog)
+        self.streams = threading.BoundedSemaphore(max_streams)
+        for n in range(workers):
+            threading.Thread(target=self._work, name=f"http-worker-{n}", daemon=True).start()
+
+    def process_request(self, request, client_address):
+        try:
+            self.jobs.put_nowait((request, client_address))
+        except queue.Full:
+            self._reject(request, "workers")
+
+    def _work(self):
+        lower_worker_thread()
+        while True:
+            request, client_address = self.jobs.get()
+            head = self._peek(request)
+            if head is None:
+                self.shutdown_request(request)
+                continue
+            if head.split(b" ", 2)[1:2] == [STREAM_PATH]:
+                # Handed to a thread of its own so this worker is free again
+                if self.streams.acquire(blocking=False):
+                    threading.Thread(target=self._stream, args=(request, client_address), daemon=True).start()
+                else:
+                    self._reject(request, "streams")
+                continue
+            self._handle(request, client_address)
+
+    def _stream(self, request, client_address):
+        lower_worker_thread()
+        try:
+            self._handle(request, client_address)
+        finally:
+            self.streams.release()
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def _peek(self, request):
+        # Start of the request line, without consuming it; None if the client
+        # sent nothing in time or hung up
+        try:
+            request.settimeout(PEEK_TIMEOUT)
+            head = request.recv(64, socket.MSG_PEEK)
+        except OSError:
+            return None
+        finally:
+            try:
+                request.settimeout(None)  # The handler sets its own
+            except OSError:
+                pass
+        return head or None
+
+    def _reject(self, request, reason):
+        REJECTED.labels(reason).inc()
+        try:
+            request.sendall(BUSY_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+
+def serve_asgi(app, host, port, workers, backlog, max_streams):
+    try:
+        import uvicorn
+        from a2wsgi import WSGIMiddleware
+    except ImportError:
+        raise SystemExit("NACHO_SERVER=asgi needs uvicorn and a2wsgi: pip install uvicorn a2wsgi")
+    # Each request holds one of the middleware's own threads until its body is
+    # sent, /events streams included, so the pool has room for both. uvicorn
+    # answers 503 itself once limit_concurrency connections are open.
+    uvicorn.run(
+        WSGIMiddleware(app, workers=workers + max_streams), host=host, port=port,
+        limit_concurrency=workers + max_streams + backlog, backlog=backlog, log_level="warning"
+    )
+
+
+def serve(app, host="0.0.0.0", port=5000):
+    mode = os.environ.get(SERVER_ENV, "threaded").lower()
+    workers = int(os.environ.get(WORKERS_ENV, 4))
+    backlog = int(os.environ.get(BACKLOG_ENV, 16))
+    max_streams = int(os.environ.get(STREAMS_ENV, 4))
+    if mode == "dev":
+        run_simple(host, port, app, threaded=True)
+    elif mode == "asgi":
+        serve_asgi(app, host, port, workers, backlog, max_streams)
+    elif mode == "threaded":
+        server = PooledWSGIServer(host, port, app, workers, backlog, max_streams)
+        print(f"Serving on {host}:{port} with {workers} workers, {backlog} queued, {max_streams} event streams")
+        server.serve_forever()
+    else:
+        raise SystemExit(f"Unknown {SERVER_ENV} '{mode}' (threaded, asgi or dev)")
@@ -0,0 +1,184 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+# Fast-forwards the feeder on a virtual clock: the real scheduler and step
+# engine run unchanged, but every wait jumps straight to its deadline. Use
+# it to check a schedule or a motion profile over weeks in seconds, e.g.
+#   python simulate.py --days 28 --manual 07:30,256 --cruise 400
+# Nothing touches the GPIO pins or the saved config and journals.
+os.environ.setdefault("NACHO_GPIO_BACKEND", "mock")
+
+import motor_logic
+import planner
+from clock import VirtualClock
+from feed_scheduler import FeedScheduler, make_slot, parse_time
+from feeders import DEFAULT_FEEDER
+from gpio_backends import MockBackend
+from step_engine import StepEngine
+
+CONFIG_FILE = os.path.join(
+    os.environ.get("NACHO_DATA_DIR") or os.path.dirname(os.path.abspath(__file__)), "schedule_config.json"
+)
+
+
+def load_settings(path, feeder_id=DEFAULT_FEEDER):
+    # Read-only view of the saved config, for one feeder
+    data = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+    if not isinstance(data, dict):
+        data = {}
+    if "slots" not in data:
+        data["slots"] = [{"time": data.get("time", "10:00"), "steps": data.get("steps", 512)}]
+    if feeder_id != DEFAULT_FEEDER:
+        matches = [feeder for feeder in data.get("feeders", []) if feeder["id"] == feeder_id]
+        if not matches:
+            raise SystemExit(f"No feeder '{feeder_id}' in {path}")
+        data = dict(matches[0], enabled=data.get("enabled", True) and matches[0].get("enabled", True))
+    data["slots"] = [make_slot(slot) for slot in data["slots"]]
+    data.setdefault("pins", motor_logic.PINS)
+    return data
+
+
+def manual_feeds(specs, start, end, default_steps):
+    # "HH:MM[,steps]" repeats daily; "YYYY-MM-DDTHH:MM[,steps]" happens once
+    feeds = []
+    for spec in specs:
+        when, _, steps = spec.partition(",")
+        steps = int(steps) if steps else default_steps
+        if "T" in when:
+            feeds.append((datetime.datetime.fromisoformat(when), steps))
+            continue
+        at = parse_time(when)
+        day = start.date()
+        while day <= end.date():
+            feeds.append((datetime.datetime.combine(day, at), steps))
+            day += datetime.timedelta(days=1)
+    return sorted(feed for feed in feeds if start <= feed[0] < end)
+
+
+def simulate(settings, start, days, manual=(), profile=None):
+    clock = VirtualClock(start)
+    engine = StepEngine(clock=clock)
+    stepper = motor_logic.StepperDriver(settings["pins"], MockBackend())
+    profile = profile or motor_logic.make_profile(
+        settings.get("start_speed"), settings.get("cruise_speed"), settings.get("accel")
+    )
+    cycle_fwd = settings.get("stutter_fwd", 100)
+    cycle_back = settings.get("stutter_back", 20)
+    end = start + datetime.timedelta(days=days)
+    manual = list(manual_feeds(manual, start, end, settings.get("steps", 512)))
+    pending = []
+
+    def fire(slot, due, catch_up):
+        # Net slots are planned the same way feed_job plans them
+        steps, fwd = slot["steps"], cycle_fwd
+        if slot.get("net"):
+            best = planner.optimize(steps, cycle_fwd, cycle_back, profile)
+            steps, fwd = best["steps"], best["cycle_fwd"]
+        pending.append((due, "scheduled", steps, fwd))
+
+    scheduler = FeedScheduler(fire, clock)
+    scheduler.configure(settings["slots"], settings.get("enabled", True))
+
+    history = []
+    intervals = []
+    while True:
+        now = clock.now()
+        while manual and manual[0][0] <= now:
+            due, steps = manual.pop(0)
+            pending.append((due, "manual", steps, cycle_fwd))
+        while scheduler.fire_next(now):
+            pass
+        if pending:
+            # One motor, so feeds that came due meanwhile wait their turn
+            pending.sort()
+            due, source, steps, fwd = pending.pop(0)
+            done = motor_logic.run_motor(
+                steps, cycle_fwd=fwd, cycle_back=cycle_back, profile=profile,
+                stepper=stepper, step_engine=engine
+            )
+            intervals.append((stepper.last_jitter or {}).get("max_ms", 0.0))
+            history.append({
+                "due": due.isoformat(timespec="seconds"),
+                "started": now.isoformat(timespec="seconds"),
+                "source": source,
+                "requested": steps,
+                "completed": done,
+                "lag_s": round((now - due).total_seconds(), 3),
+                "duration_s": round((clock.now() - now).total_seconds(), 3),
+            })
+            continue
+        upcoming = [when for when in (scheduler.next_run(), manual[0][0] if manual else None) if when]
+        if not upcoming or min(upcoming) >= end:
+            break
+        clock.advance_to(min(upcoming))
+    return history, summarize(history, days, profile, intervals)
+
+
+def summarize(history, days, profile, intervals):
+    durations = sorted(entry["duration_s"] for entry in history)
+    lags = sorted(entry["lag_s"] for entry in history)
+    return {
+        "days": days,
+        "profile": profile._asdict(),
+        "feeds": len(history),
+        "scheduled": sum(entry["source"] == "scheduled" for entry in history),
+        "manual": sum(entry["source"] == "manual" for entry in history),
+        "steps": sum(entry["completed"] for entry in history),
+        "motor_on_s": round(sum(durations), 3),
+        "feed_duration_s": {
+            "min": durations[0], "p50": durations[len(durations) // 2], "max": durations[-1],
+        } if durations else None,
+        "lag_s": {"p50": lags[len(lags) // 2], "max": lags[-1]} if lags else None,
+        "max_interval_error_ms": max(intervals) if intervals else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay scheduled and manual feeds on a virtual clock")
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--start", help="ISO date/time to start from (default: now)")
+    parser.add_argument("--config", default=CONFIG_FILE)
+    parser.add_argument("--feeder", default=DEFAULT_FEEDER)
+    parser.add_argument("--force-enabled", action="store_true", help="Run the schedule even if it is switched off")
+    parser.add_argument("--manual", action="append", default=[], help="HH:MM[,steps] daily or YYYY-MM-DDTHH:MM[,steps] once")
+    parser.add_argument("--fwd", type=int, help="Override the saved stutter forward steps")
+    parser.add_argument("--back", type=int, help="Override the saved stutter reverse steps")
+    parser.add_argument("--start-speed", type=float)
+    parser.add_argument("--cruise", type=float)
+    parser.add_argument("--accel", type=float)
+    parser.add_argument("--history", type=int, default=20, help="Feeds to list, newest last (-1 for all)")
+    args = parser.parse_args()
+
+    settings = load_settings(args.config, args.feeder)
+    if args.force_enabled:
+        settings["enabled"] = True
+    if args.fwd is not None:
+        settings["stutter_fwd"] = args.fwd
+    if args.back is not None:
+        settings["stutter_back"] = args.back
+    profile = motor_logic.make_profile(
+        args.start_speed if args.start_speed is not None else settings.get("start_speed"),
+        args.cruise if args.cruise is not None else settings.get("cruise_speed"),
+        args.accel if args.accel is not None else settings.get("accel"),
+    )
+    start = datetime.datetime.fromisoformat(args.start) if args.start else datetime.datetime.now()
+
+    began = time.perf_counter()
+    history, summary = simulate(settings, start, args.days, args.manual, profile)
+    elapsed = time.perf_counter() - began
+    summary["real_s"] = round(elapsed, 3)
+    summary["speedup"] = round(args.days * 86400 / elapsed) if elapsed else None
+
+    shown = history if args.history < 0 else history[-args.history:] if args.history else []
+    print(json.dumps({"summary": summary, "history": shown}, indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
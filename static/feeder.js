@@ -0,0 +1,223 @@
+function updateLabel(id, val) { document.getElementById(id).innerText = val; }
+
+
+
+function move(dir) {
+    const steps = document.getElementById('stepSlider').value;
+    const stutter = true;
+    const cycle_fwd = document.getElementById('stutterFwd').value;
+    const cycle_back = document.getElementById('stutterBack').value;
+    const start_speed = document.getElementById('startSpeed').value;
+    const cruise_speed = document.getElementById('cruiseSpeed').value;
+    const accel = document.getElementById('accel').value;
+
+    const status = document.getElementById('status');
+    status.innerText = "Starting...";
+
+    fetch('/move', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({
+            direction: dir, 
+            steps: parseInt(steps), 
+            stutter: stutter,
+            cycle_fwd: parseInt(cycle_fwd),
+            cycle_back: parseInt(cycle_back),
+            start_speed: parseInt(start_speed),
+            cruise_speed: parseInt(cruise_speed),
+            accel: parseInt(accel)
+        })
+    })
+    .then(res => res.json())
+    .then(data => {
+        if(data.status === "queued") {
+            // The start event may already have arrived over /events
+            if (status.innerText === "Starting...") status.innerText = "Queued...";
+        } else if(data.status !== "running") {
+            status.innerText = data.message || "Error";
+        }
+    });
+}
+
+function stop() {
+    fetch('/stop', {method: 'POST'});
+}
+
+function showFeeding(feeding) {
+    document.getElementById('btnDispense').style.display = feeding ? 'none' : 'block';
+    document.getElementById('btnStop').style.display = feeding ? 'block' : 'none';
+}
+
+function addHistory(text, snapshot) {
+    const list = document.getElementById('historyList');
+    const empty = document.getElementById('noHistory');
+    if (empty) empty.remove();
+    const item = document.createElement('li');
+    item.innerText = text;
+    if (snapshot) {
+        const link = document.createElement('a');
+        link.href = '/snapshots/' + snapshot;
+        link.target = '_blank';
+        link.innerText = ' 📷';
+        item.appendChild(link);
+    }
+    list.prepend(item);
+    while (list.children.length > 5) list.lastElementChild.remove();
+}
+
+// Feed progress is pushed by the server as it happens
+function handleFeedEvent(ev) {
+    // This page only shows the main feeder
+    if (ev.feeder && ev.feeder !== 'main') return;
+    const status = document.getElementById('status');
+    if (ev.type === 'start') {
+        showFeeding(true);
+        status.innerText = "Feeding in progress (~" + Math.ceil(ev.duration) + "s)...";
+        status.style.color = "#ff9800";
+    } else if (ev.type === 'progress') {
+        showFeeding(true);
+        status.innerText = "Feeding: " + ev.steps_done + "/" + ev.steps + " steps" +
+            (ev.phase === 'reverse' ? " (reversing)" : "") + ", ~" + Math.ceil(ev.eta) + "s left";
+        status.style.color = "#ff9800";
+    } else if (ev.type === 'complete' || ev.type === 'stopped') {
+        showFeeding(false);
+        status.innerText = ev.type === 'complete' ? "Feeding Complete ✨" : "Feeding Stopped (" + ev.steps_done + " steps)";
+        status.style.color = "#689f38";
+        addHistory(ev.history, ev.snapshot);
+    } else if (ev.type === 'error') {
+        showFeeding(false);
+        status.innerText = "Motor error: " + ev.message;
+        status.style.color = "#e53935";
+    }
+}
+
+const feedEvents = new EventSource('/events');
+feedEvents.onmessage = (msg) => handleFeedEvent(JSON.parse(msg.data));
+
+
+function updateSchedule() {
+    const time = document.getElementById('scheduleTime').value;
+    const enabled = document.getElementById('scheduleEnabled').checked;
+    const status = document.getElementById('status');
+    status.innerText = "Updating schedule...";
+
+    fetch('/set_schedule', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({time: time, enabled: enabled})
+    })
+    .then(res => res.json())
+    .then(data => {
+        status.innerText = "Schedule Saved! 🕒";
+        setTimeout(() => { status.innerText = "System Ready"; }, 2000);
+    });
+}
+
+function updateNextRunLabel() {
+    const enabled = document.getElementById('scheduleEnabled').checked;
+    const time = document.getElementById('scheduleTime').value;
+    const label = document.getElementById('nextRun');
+
+    if (!enabled) {
+        label.innerText = "⛔ Schedule Disabled";
+        label.style.color = "#b0bec5"; // Gray
+        return;
+    }
+
+    // formatting time to AM/PM for display
+    const [hours, minutes] = time.split(':');
+    const d = new Date();
+    d.setHours(hours);
+    d.setMinutes(minutes);
+    const timeString = d.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+
+    const extra = Math.max(scheduleSlots.length - 1, 0);
+    label.innerText = "⚡ Next Feed: Daily at " + timeString + (extra > 0 ? " (+" + extra + " more)" : "");
+    label.style.color = "#0277bd"; // Blue
+}
+
+// Config and recent history come from /state; the browser revalidates it
+// with If-None-Match, so an unchanged state costs a 304.
+let scheduleSlots = [];
+
+function setSlider(id, labelId, value) {
+    document.getElementById(id).value = value;
+    updateLabel(labelId, Math.round(value));
+}
+
+function applyState(state) {
+    const config = state.config;
+    setSlider('stepSlider', 'stepVal', config.steps);
+    setSlider('stutterFwd', 'fwdVal', config.stutter_fwd);
+    setSlider('stutterBack', 'backVal', config.stutter_back);
+    setSlider('startSpeed', 'startVal', config.start_speed);
+    setSlider('cruiseSpeed', 'cruiseVal', config.cruise_speed);
+    setSlider('accel', 'accelVal', config.accel);
+
+    scheduleSlots = config.slots;
+    document.getElementById('scheduleEnabled').checked = config.enabled;
+    document.getElementById('scheduleTime').value = scheduleSlots.length ? scheduleSlots[0].time : '10:00';
+    updateNextRunLabel();
+
+    const list = document.getElementById('historyList');
+    list.innerHTML = '<li id="noHistory">No recent feedings</li>';
+    state.history.slice().reverse().forEach(entry => addHistory(entry.text, entry.snapshot));
+    document.getElementById('cameraName').value = config.camera_name || '';
+    showResumeOffer(state.resume);
+}
+
+// A feed cut short by a crash or power loss, offered for resuming
+let resumeOffer = null;
+
+function showResumeOffer(offers) {
+    resumeOffer = (offers || []).find(offer => offer.feeder === 'main') || null;
+    document.getElementById('resumeOffer').style.display = resumeOffer ? 'block' : 'none';
+    if (resumeOffer) {
+        const when = new Date(resumeOffer.ts * 1000).toLocaleString();
+        document.getElementById('resumeText').innerText = "Feed from " + when + " was interrupted at " +
+            resumeOffer.steps_done + "/" + resumeOffer.requested + " steps.";
+    }
+}
+
+function resumeFeed() {
+    if (!resumeOffer) return;
+    fetch('/resume/' + resumeOffer.job, {method: 'POST'})
+        .then(() => fetch('/resume')).then(res => res.json()).then(data => showResumeOffer(data.offers));
+}
+
+function dismissResume() {
+    if (!resumeOffer) return;
+    fetch('/resume/' + resumeOffer.job, {method: 'DELETE'})
+        .then(() => fetch('/resume')).then(res => res.json()).then(data => showResumeOffer(data.offers));
+}
+
+// Camera: the server shares one cached snapshot between all viewers and
+// answers 304 while it hasn't changed, so polling it is cheap
+let cameraUrl = null;
+
+function refreshCamera() {
+    const img = document.getElementById('cameraImg');
+    fetch('/snapshot.jpg?thumb=1', {cache: 'no-cache'})
+        .then(res => { if (!res.ok) throw new Error(res.status); return res.blob(); })
+        .then(blob => {
+            if (cameraUrl) URL.revokeObjectURL(cameraUrl);
+            cameraUrl = URL.createObjectURL(blob);
+            img.src = cameraUrl;
+            img.style.display = 'block';
+        })
+        .catch(() => { img.style.display = 'none'; });
+}
+
+function updateCamera() {
+    fetch('/set_schedule', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({camera_name: document.getElementById('cameraName').value})
+    }).then(refreshCamera);
+}
+
+// Initial setup
+fetch('/state').then(res => res.json()).then(applyState);
+updateNextRunLabel();
+refreshCamera();
+setInterval(refreshCamera, 10000);
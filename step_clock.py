@@ -0,0 +1,56 @@
+from array import array
+
+
+class StepClock:
+    # Deadline bookkeeping for one motor's phases. Each phase is scheduled
+    # against an absolute deadline rather than a fixed delay after the last
+    # write, so GPIO write cost and wakeup latency don't pile up over a long
+    # feed. The step engine does the actual waiting.
+    def __init__(self, max_lag=0.02, min_ratio=0.5):
+        self.max_lag = max_lag  # Further behind than this, give up and resync
+        self.min_ratio = min_ratio  # Catch-up never shortens a phase below this fraction
+        self.deadline = None
+        self.last = None
+        self.next = None
+        self.interval = 0.0
+        self.errors = array('d')
+        self.resyncs = 0
+
+    def start(self, now):
+        self.deadline = self.last = self.next = now
+        self.errors = array('d')
+        self.resyncs = 0
+
+    def schedule(self, interval):
+        # Deadline of the next phase, after one lasting `interval`. Small
+        # misses are made up on the following phases, but never by squeezing
+        # a phase so short that the motor could stall.
+        self.interval = interval
+        self.next = max(self.deadline + interval, self.last + interval * self.min_ratio)
+        return self.next
+
+    def arrived(self, woke):
+        self.errors.append(woke - self.last - self.interval)
+        self.last = woke
+        if woke - self.next > self.max_lag:
+            # Missed by too much (e.g. a long GC or SD-card stall); bursting
+            # to catch up would skip steps, so restart the timeline from here.
+            self.deadline = woke
+            self.resyncs += 1
+        else:
+            self.deadline = self.next
+
+    def stats(self):
+        # Phase interval error in milliseconds
+        if not self.errors:
+            return None
+        errors = sorted(self.errors)
+        last = len(errors) - 1
+        return {
+            "phases": len(errors),
+            "min_ms": round(errors[0] * 1000, 3),
+            "p50_ms": round(errors[last // 2] * 1000, 3),
+            "p99_ms": round(errors[last * 99 // 100] * 1000, 3),
+            "max_ms": round(errors[last] * 1000, 3),
+            "resyncs": self.resyncs,
+        }
@@ -0,0 +1,194 @@
+import heapq
+import itertools
+import threading
+import time
+
+from clock import SYSTEM_CLOCK
+from metrics import FAST_BUCKETS, Counter, Histogram
+from priority import elevate_motor_thread
+from step_clock import StepClock
+
+# Stop events with a watch() method (motor_logic.StopEvent) wake the loop
+# themselves. For any other kind, a wait on a far deadline (e.g. a reversal
+# pause) is cut into pieces this long so the stop is still noticed.
+INTERRUPT_AFTER = 0.01
+
+PHASES_PER_STEP = 8
+
+STEPS = Counter("feeder_motor_steps_total", "Whole motor steps emitted")
+RESYNCS = Counter("feeder_motor_resyncs_total", "Times a run fell too far behind and restarted its timeline")
+# Early wakeups (negative) come from catch-up shortening a phase
+INTERVAL_ERROR = Histogram(
+    "feeder_motor_interval_error_seconds", "Actual minus planned half-step interval",
+    buckets=(-0.001, -0.0001, 0.0) + FAST_BUCKETS
+)
+GPIO_WRITE = Histogram("feeder_gpio_write_seconds", "Time spent writing one phase to the GPIO pins", buckets=FAST_BUCKETS)
+STOP_LATENCY = Histogram("feeder_stop_latency_seconds", "Time from a stop request to the coils being released", buckets=FAST_BUCKETS)
+
+
+class Run:
+    # One plan being played on one driver
+    def __init__(self, plan, driver, stop_event=None, progress=None, progress_interval=0.25):
+        self.plan = plan
+        self.driver = driver
+        self.stop_event = stop_event
+        self.progress = progress  # progress(phases_done, elapsed), at most once per progress_interval
+        self.progress_interval = progress_interval
+        self.clock = StepClock()
+        self.index = 0  # Next phase to write
+        self.started = None
+        self.next_report = None
+        self.steps = 0
+        self.stop_latency = None
+        self.jitter = None
+        self.error = None
+        self.done = threading.Event()
+
+    def stopping(self):
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    @property
+    def polls_stop(self):
+        return self.stop_event is not None and not hasattr(self.stop_event, "watch")
+
+
+class StepEngine:
+    # A single timing loop for every motor. Active runs sit in a heap keyed
+    # on their next phase deadline and the loop services whichever is due
+    # first, so several steppers share one clock and one thread instead of
+    # each sleeping on its own.
+    def __init__(self, spin=0.0003, clock=SYSTEM_CLOCK):
+        self.spin = spin  # Busy-wait the last part of each wait for precision
+        self.clock = clock
+        self.cond = threading.Condition()
+        self.heap = []
+        self.seq = itertools.count()
+        self.thread = None
+
+    def play(self, plan, driver, stop_event=None, progress=None, progress_interval=0.25):
+        # Blocks the caller until the run finishes or is stopped
+        run = Run(plan, driver, stop_event, progress, progress_interval)
+        self.start(run)
+        if self.clock.virtual:
+            self.drain()
+        run.done.wait()
+        return run
+
+    def start(self, run):
+        run.driver.setup()
+        now = self.clock.perf_counter()
+        run.clock.start(now)
+        run.started = now
+        run.next_report = now if run.progress else float("inf")
+        deadline = run.clock.schedule(run.plan.lead_in) if run.plan.lead_in else now
+        if hasattr(run.stop_event, "watch"):
+            run.stop_event.watch(self.wake)
+        with self.cond:
+            if self.thread is None and not self.clock.virtual:
+                self.thread = threading.Thread(target=self.loop, daemon=True)
+                self.thread.start()
+            heapq.heappush(self.heap, (deadline, next(self.seq), run))
+            self.cond.notify()
+        return run
+
+    def wake(self):
+        # Called from whichever thread requested a stop
+        with self.cond:
+            self.cond.notify()
+
+    def loop(self):
+        applied = elevate_motor_thread()
+        print(f"Step engine running with {', '.join(applied) or 'default priority'}")
+        clock = self.clock
+        now = clock.perf_counter
+        while True:
+            with self.cond:
+                if not self.heap:
+                    self.cond.wait()
+                    continue
+                self._reap_stopped()
+                if not self.heap:
+                    continue
+                deadline, _, run = self.heap[0]
+                remaining = deadline - now()
+                if remaining > self.spin:
+                    # Woken early by new runs and stop requests
+                    timeout = remaining - self.spin
+                    if any(entry[2].polls_stop for entry in self.heap):
+                        timeout = min(timeout, INTERRUPT_AFTER)
+                    clock.wait(self.cond, timeout)
+                    continue
+                heapq.heappop(self.heap)
+            clock.sleep_until(deadline)
+            self._step(run, now())
+
+    def drain(self):
+        # Virtual clocks have no timing thread: the caller plays every
+        # active run to the end, jumping from one deadline to the next
+        while True:
+            with self.cond:
+                self._reap_stopped()
+                if not self.heap:
+                    return
+                deadline, _, run = heapq.heappop(self.heap)
+            self.clock.sleep_until(deadline)
+            self._step(run, self.clock.perf_counter())
+
+    def _step(self, run, woke):
+        plan = run.plan
+        i = run.index
+        if i or plan.lead_in:
+            run.clock.arrived(woke)
+        if run.stopping():
+            self._finish(run, i // PHASES_PER_STEP)
+            return
+        if i == len(plan.codes):
+            self._finish(run, plan.steps)
+            return
+        driver = run.driver
+        code = plan.codes[i]
+        try:
+            written = time.perf_counter()
+            driver.gpio.write(*driver.transitions[driver.state][code])
+            GPIO_WRITE.observe(time.perf_counter() - written)
+            driver.state = code
+            if woke >= run.next_report:
+                run.progress(i, woke - run.started)
+                run.next_report = woke + run.progress_interval
+        except Exception as e:
+            run.error = e
+            self._finish(run, i // PHASES_PER_STEP)
+            return
+        run.index = i + 1
+        deadline = run.clock.schedule(plan.dwells[i])
+        with self.cond:
+            heapq.heappush(self.heap, (deadline, next(self.seq), run))
+
+    def _reap_stopped(self):
+        # Called with the lock held: finish stopped runs without waiting for their deadline
+        stopped = [entry for entry in self.heap if entry[2].stopping()]
+        if not stopped:
+            return
+        self.heap = [entry for entry in self.heap if not entry[2].stopping()]
+        heapq.heapify(self.heap)
+        for _, _, run in stopped:
+            self._finish(run, run.index // PHASES_PER_STEP)
+
+    def _finish(self, run, steps):
+        try:
+            # Turn off coils to save 9V battery
+            run.driver.release()
+        except Exception as e:
+            run.error = run.error or e
+        requested_at = getattr(run.stop_event, "requested_at", None)
+        if run.stopping() and requested_at is not None:
+            run.stop_latency = time.perf_counter() - requested_at
+            STOP_LATENCY.observe(run.stop_latency)
+        run.steps = steps
+        run.jitter = run.clock.stats()
+        # Per-phase errors are already kept by the clock, so they are only
+        # folded into the histogram once the run is over
+        STEPS.inc(steps)
+        RESYNCS.inc(run.clock.resyncs)
+        INTERVAL_ERROR.observe_many(run.clock.errors)
+        run.done.set()
@@ -0,0 +1,58 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+# Importing app reads NACHO_DATA_DIR; point it somewhere harmless first
+os.environ.setdefault("NACHO_DATA_DIR", tempfile.mkdtemp())
+
+from app import CONFIG_DEFAULTS, migrate_slots
+from config_store import ConfigStore
+from feed_scheduler import EVERY_DAY
+
+# Loading config files written by older versions, with the app's own
+# migrations and defaults.
+#   python -m unittest test_config_store   (or pytest)
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "schedule_config.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def load(self, content):
+        with open(self.path, "w") as f:
+            f.write(content if isinstance(content, str) else json.dumps(content))
+        return ConfigStore(self.path, CONFIG_DEFAULTS, migrations=[migrate_slots]).load()
+
+    def test_legacy_time_becomes_first_slot(self):
+        data = self.load({"time": "07:15", "steps": 300, "enabled": False})
+        self.assertEqual(data["schema"], 1)
+        self.assertNotIn("time", data)
+        self.assertEqual(len(data["slots"]), 1)
+        slot = data["slots"][0]
+        self.assertEqual((slot["time"], slot["steps"], slot["days"], slot["enabled"]), ("07:15", 300, EVERY_DAY, True))
+        self.assertFalse(data["enabled"])  # Untouched keys survive
+        self.assertEqual(data["catch_up"], CONFIG_DEFAULTS["catch_up"])  # Missing ones get defaults
+
+    def test_bare_time_file(self):
+        # The oldest files held only the time string
+        data = self.load('"08:30"')
+        self.assertEqual([(s["time"], s["steps"]) for s in data["slots"]], [("08:30", 512)])
+
+    def test_current_schema_not_migrated_again(self):
+        data = self.load({"schema": 1, "slots": [], "time": "09:00"})
+        self.assertEqual(data["slots"], [])
+
+    def test_unreadable_file_kept_aside(self):
+        data = self.load("{not json")
+        self.assertEqual(data["slots"], CONFIG_DEFAULTS["slots"])
+        self.assertTrue(os.path.exists(self.path + ".corrupt"))
+
+
+if __name__ == "__main__":
+    unittest.main()
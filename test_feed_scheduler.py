@@ -0,0 +1,77 @@
+import datetime
+import unittest
+
+from clock import VirtualClock
+from feed_scheduler import EVERY_DAY, FeedScheduler, last_occurrence, make_slot, next_occurrence
+
+# Weekday masks and catch-up after downtime, on a virtual clock so nothing
+# waits. 2024-01-07 is a Sunday and 2024-01-08 the Monday after it.
+#   python -m unittest test_feed_scheduler   (or pytest)
+
+MONDAY = 1 << 0
+WEDNESDAY = 1 << 2
+SUNDAY = 1 << 6
+
+SAT_EVENING = datetime.datetime(2024, 1, 6, 20, 0)
+SUN_EVENING = datetime.datetime(2024, 1, 7, 20, 0)
+MON_MORNING = datetime.datetime(2024, 1, 8, 7, 0)
+
+
+def slot(time, days=EVERY_DAY):
+    return make_slot({"time": time, "steps": 100, "days": days})
+
+
+class WeekdayMaskTest(unittest.TestCase):
+    def test_next_wraps_from_sunday_to_monday(self):
+        self.assertEqual(next_occurrence(slot("08:00", MONDAY), SUN_EVENING), datetime.datetime(2024, 1, 8, 8, 0))
+
+    def test_next_skips_to_the_same_day_next_week(self):
+        # Monday 07:00 -> the 06:00 Monday slot is next week
+        self.assertEqual(next_occurrence(slot("06:00", MONDAY), MON_MORNING), datetime.datetime(2024, 1, 15, 6, 0))
+
+    def test_next_picks_the_first_allowed_day(self):
+        self.assertEqual(
+            next_occurrence(slot("08:00", WEDNESDAY | SUNDAY), SAT_EVENING), datetime.datetime(2024, 1, 7, 8, 0)
+        )
+
+    def test_last_wraps_from_monday_to_sunday(self):
+        self.assertEqual(last_occurrence(slot("21:00", SUNDAY), MON_MORNING), datetime.datetime(2024, 1, 7, 21, 0))
+
+    def test_bad_masks_rejected(self):
+        for days in (0, EVERY_DAY + 1):
+            with self.assertRaises(ValueError):
+                slot("08:00", days)
+
+
+class CatchUpTest(unittest.TestCase):
+    def setUp(self):
+        self.fired = []
+        self.scheduler = FeedScheduler(lambda slot, due, catch_up: self.fired.append((slot["time"], due, catch_up)),
+                                       VirtualClock(MON_MORNING))
+
+    def test_fires_missed_slot_within_window(self):
+        # Down since Sunday evening; Sunday's 21:00 slot was 10 hours ago
+        missed = self.scheduler.catch_up([slot("21:00", SUNDAY)], SUN_EVENING, "once", window_hours=12)
+        self.assertEqual(len(missed), 1)
+        self.assertEqual(self.fired, [("21:00", datetime.datetime(2024, 1, 7, 21, 0), True)])
+
+    def test_skips_missed_slot_outside_window(self):
+        self.scheduler.catch_up([slot("21:00", SUNDAY)], SUN_EVENING, "once", window_hours=6)
+        self.assertEqual(self.fired, [])
+
+    def test_fires_each_slot_at_most_once(self):
+        # Down since Saturday evening: only the most recent 06:00 counts
+        self.scheduler.catch_up([slot("06:00")], SAT_EVENING, "once", window_hours=48)
+        self.assertEqual(self.fired, [("06:00", datetime.datetime(2024, 1, 8, 6, 0), True)])
+
+    def test_ignores_slots_that_ran(self):
+        self.scheduler.catch_up([slot("21:00", SUNDAY)], datetime.datetime(2024, 1, 7, 21, 5), "once", window_hours=12)
+        self.assertEqual(self.fired, [])
+
+    def test_skip_policy(self):
+        self.scheduler.catch_up([slot("06:00")], SUN_EVENING, "skip", window_hours=12)
+        self.assertEqual(self.fired, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
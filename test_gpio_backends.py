@@ -0,0 +1,100 @@
+import os
+import struct
+import tempfile
+import unittest
+
+import motor_logic
+from gpio_backends import BLOCK_SIZE, GPCLR0, GPSET0, MmapBackend, create_register_file
+
+# Checks MmapBackend's register writes against a zeroed file standing in for
+# /dev/gpiomem. Expected values are worked out by hand from the BCM2835
+# datasheet, not from the backend's own helpers.
+#   python -m unittest test_gpio_backends   (or pytest)
+
+GPFSEL1 = 0x04  # Function select for pins 10-19
+GPFSEL2 = 0x08  # Function select for pins 20-29
+
+PIN_17 = 1 << 17
+PIN_18 = 1 << 18
+PIN_22 = 1 << 22
+PIN_27 = 1 << 27
+
+# (GPSET0, GPCLR0) for each phase of one forward half-step cycle on
+# PINS = [17, 18, 27, 22], starting with every coil off; 0 = not written
+HALF_STEP_WRITES = [
+    (PIN_17, 0),  # [1, 0, 0, 0]
+    (PIN_18, 0),  # [1, 1, 0, 0]
+    (0, PIN_17),  # [0, 1, 0, 0]
+    (PIN_27, 0),  # [0, 1, 1, 0]
+    (0, PIN_18),  # [0, 0, 1, 0]
+    (PIN_22, 0),  # [0, 0, 1, 1]
+    (0, PIN_27),  # [0, 0, 0, 1]
+    (PIN_17, 0),  # [1, 0, 0, 1]
+]
+
+
+class MmapBackendTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        create_register_file(self.path)
+        self.gpio = MmapBackend(self.path)
+        self.driver = motor_logic.StepperDriver(motor_logic.PINS, self.gpio)
+        self.driver.setup()
+
+    def tearDown(self):
+        self.driver.close()
+        os.remove(self.path)
+
+    def register(self, offset):
+        # Through the backend while it's open, else straight from the file
+        if self.gpio.regs is not None:
+            return self.gpio.read_register(offset)
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return struct.unpack("<I", f.read(4))[0]
+
+    def clear_write_registers(self):
+        # GPSET0/GPCLR0 are write-only on a Pi; zeroing them here shows which
+        # one the next phase wrote
+        self.gpio.regs[GPSET0 // 4] = 0
+        self.gpio.regs[GPCLR0 // 4] = 0
+
+    def test_register_file_size(self):
+        self.assertEqual(os.path.getsize(self.path), BLOCK_SIZE)
+
+    def test_setup_makes_coil_pins_outputs(self):
+        # Function 001 (output) at 3 bits per pin: 17 -> bit 21, 18 -> bit 24,
+        # 22 -> bit 6 and 27 -> bit 21 of the next register
+        self.assertEqual(self.register(GPFSEL1), 0x01200000)
+        self.assertEqual(self.register(GPFSEL2), 0x00200040)
+        self.assertEqual(self.register(GPCLR0), PIN_17 | PIN_18 | PIN_22 | PIN_27)
+
+    def test_half_step_cycle_writes(self):
+        for code, expected in zip(motor_logic.FORWARD_CODES, HALF_STEP_WRITES):
+            self.clear_write_registers()
+            self.driver.apply(code)
+            self.assertEqual((self.register(GPSET0), self.register(GPCLR0)), expected)
+        # Back to the first phase: only pin 22 changes
+        self.clear_write_registers()
+        self.driver.apply(motor_logic.FORWARD_CODES[0])
+        self.assertEqual((self.register(GPSET0), self.register(GPCLR0)), (0, PIN_22))
+
+    def test_release_clears_energised_coils(self):
+        self.driver.apply(motor_logic.FORWARD_CODES[1])  # Pins 17 and 18 on
+        self.clear_write_registers()
+        self.driver.release()
+        self.assertEqual(self.register(GPSET0), 0)
+        self.assertEqual(self.register(GPCLR0), PIN_17 | PIN_18)
+
+    def test_cleanup_clears_pins_and_makes_them_inputs(self):
+        self.driver.apply(motor_logic.FORWARD_CODES[3])  # Pins 18 and 27 on
+        self.clear_write_registers()
+        self.driver.close()
+        self.assertEqual(self.register(GPCLR0), PIN_17 | PIN_18 | PIN_22 | PIN_27)
+        self.assertEqual(self.register(GPFSEL1), 0)
+        self.assertEqual(self.register(GPFSEL2), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+import planner
+from motor_logic import MAX_CYCLE, MAX_STEPS
+
+# Net-steps arithmetic and the optimizer's jam limit. Expected totals are
+# worked out by hand from the stutter pattern, not from planner's helpers.
+#   python -m unittest test_planner   (or pytest)
+
+
+class StepsForNetTest(unittest.TestCase):
+    def test_within_one_forward_run(self):
+        self.assertEqual(planner.steps_for_net(0, 100, 20), 0)
+        self.assertEqual(planner.steps_for_net(100, 100, 20), 100)
+
+    def test_no_reverse(self):
+        self.assertEqual(planner.steps_for_net(250, 100, 0), 250)
+
+    def test_reverse_not_shorter_than_forward(self):
+        self.assertIsNone(planner.steps_for_net(150, 20, 20))
+
+    def test_full_cycles_then_last_run(self):
+        # 100 forward, 20 back, 100 forward, 20 back, then 60 to reach 220:
+        # 100 + 20 + 100 + 20 + 60 = 300 steps, net 100 - 20 + 100 - 20 + 60
+        self.assertEqual(planner.steps_for_net(220, 100, 20), 300)
+        # Exactly one full cycle short: 100 + 20 + 100
+        self.assertEqual(planner.steps_for_net(180, 100, 20), 220)
+
+    def test_matches_estimate(self):
+        for net in (1, 79, 80, 81, 180, 181, 999):
+            steps = planner.steps_for_net(net, 100, 20)
+            self.assertEqual(planner.estimate(steps, 100, 20)["net_steps"], net)
+
+
+class OptimizeTest(unittest.TestCase):
+    def test_short_feed_needs_no_reverse(self):
+        plan = planner.optimize(50, 100)
+        self.assertEqual((plan["steps"], plan["net_steps"], plan["reversals"]), (50, 50, 0))
+
+    def test_respects_max_forward(self):
+        for net, max_forward in ((500, 100), (1000, 64), (333, 30)):
+            plan = planner.optimize(net, max_forward, cycle_back=20)
+            self.assertEqual(plan["net_steps"], net)
+            self.assertLessEqual(plan["cycle_fwd"], max_forward)
+            self.assertLessEqual(plan["max_forward_run"], max_forward)
+            self.assertEqual(plan["cycle_back"], 20)
+
+    def test_no_faster_cycle_within_limit(self):
+        plan = planner.optimize(500, 100, cycle_back=20)
+        for cycle_fwd in range(21, 101):
+            steps = planner.steps_for_net(500, cycle_fwd, 20)
+            if steps > MAX_STEPS:
+                continue
+            self.assertGreaterEqual(planner.estimate(steps, cycle_fwd, 20)["duration"], plan["duration"])
+
+    def test_rejects_impossible_limits(self):
+        with self.assertRaises(ValueError):
+            planner.optimize(500, 20, cycle_back=20)  # Never gets anywhere
+        with self.assertRaises(ValueError):
+            planner.optimize(500, 100, cycle_back=0)
+        with self.assertRaises(ValueError):
+            planner.optimize(500, MAX_CYCLE + 1)
+        with self.assertRaises(ValueError):
+            planner.optimize(MAX_STEPS + 1, 100)
+        with self.assertRaises(ValueError):
+            planner.optimize(333, 21, cycle_back=20)  # 1 step net per cycle is over MAX_STEPS
+
+    def test_stays_within_max_steps(self):
+        # Short cycles would need more than MAX_STEPS, so a longer one is picked
+        plan = planner.optimize(4000, 100, cycle_back=20)
+        self.assertLessEqual(plan["steps"], MAX_STEPS)
+        self.assertEqual(plan["net_steps"], 4000)
+
+
+if __name__ == "__main__":
+    unittest.main()